@@ -0,0 +1,54 @@
+"""
+Compares logging rows one at a time with RexDB.log against logging them in
+batches with RexDB.log_many.
+
+Run from the repository root:
+    python -m benchmarks.log_many [rows] [batch_size]
+"""
+import sys
+import tempfile
+import time
+
+from src.rexdb import RexDB
+
+FSTRING = "ifc"
+FIELDS = ("integer", "float", "char")
+
+
+def bench_log(filepath, rows):
+    db = RexDB(FSTRING, FIELDS, filepath=filepath)
+    start = time.perf_counter()
+    for i in range(rows):
+        db.log((i, 0.5, b'a'))
+    db.close()
+    return time.perf_counter() - start
+
+
+def bench_log_many(filepath, rows, batch_size):
+    db = RexDB(FSTRING, FIELDS, filepath=filepath)
+    batch = [(i, 0.5, b'a') for i in range(batch_size)]
+    start = time.perf_counter()
+    for _ in range(rows // batch_size):
+        db.log_many(batch)
+    db.close()
+    return time.perf_counter() - start
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    rows -= rows % batch_size
+
+    with tempfile.TemporaryDirectory() as filepath:
+        log_time = bench_log(filepath, rows)
+    with tempfile.TemporaryDirectory() as filepath:
+        log_many_time = bench_log_many(filepath, rows, batch_size)
+
+    print(f"log:      {rows} rows in {log_time:.3f}s ({rows / log_time:,.0f} rows/s)")
+    print(f"log_many: {rows} rows in {log_many_time:.3f}s ({rows / log_many_time:,.0f} rows/s)"
+          f" with batches of {batch_size}")
+    print(f"speedup:  {log_time / log_many_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Measures how get_data_at_range scales with the number of thread and process
+workers reading files in parallel.
+
+Run from the repository root:
+    python -m benchmarks.parallel_scan [rows] [bytes_per_file]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from src.rexdb import RexDB
+
+FSTRING = "idddQ"
+FIELDS = ("integer", "double1", "double2", "double3", "ulonglong")
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    bytes_per_file = int(sys.argv[2]) if len(sys.argv) > 2 else 64 * 1024
+    now = [1_600_000_000]
+
+    def clock():
+        return time.localtime(now[0])
+
+    with tempfile.TemporaryDirectory() as filepath:
+        db = RexDB(FSTRING, FIELDS, bytes_per_file=bytes_per_file, files_per_folder=50,
+                   time_method=clock, filepath=filepath)
+        start = clock()
+        batch = 1000
+        for i in range(0, rows, batch):
+            db.log_many([(j, j / 2, j / 3, j / 4, j) for j in range(i, i + batch)])
+            now[0] += 1
+        end = clock()
+        db.close()
+
+        started = time.perf_counter()
+        expected = len(db.get_data_at_range(start, end))
+        serial = time.perf_counter() - started
+        print(f"{expected} rows in {len(db._file_manager.locations_from_range(time.mktime(start), time.mktime(end)))}"
+              f" files, serial scan {serial:.3f}s")
+
+        for executor in ("thread", "process"):
+            for workers in (1, 2, 4, 8):
+                if workers > (os.cpu_count() or 1) * 2:
+                    break
+                started = time.perf_counter()
+                count = len(db.get_data_at_range(start, end, workers=workers, executor=executor))
+                elapsed = time.perf_counter() - started
+                assert count == expected
+                print(f"{executor:7} workers={workers}: {elapsed:.3f}s ({serial / elapsed:.2f}x serial)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Measures ingest, point query, range scan and reopen performance over a sweep of
+database layouts, and prints the results as JSON.
+
+Every database is filled from a deterministic clock that advances one second per
+row, and queries are drawn from a seeded random generator, so runs on the same
+machine are comparable across versions. Databases are created in a temporary
+directory under --dir, which can be a real disk or a tmpfs mount.
+
+Run from the repository root:
+    python -m benchmarks.suite [--rows 100000 1000000] [--widths 1 4 16]
+        [--bytes-per-file 1024 65536] [--files-per-folder 50] [--dir /mnt/tmpfs]
+        [--output results.json]
+"""
+import argparse
+import itertools
+import json
+import platform
+import random
+import sys
+import tempfile
+import time
+
+from src.rexdb import RexDB, VERSION
+
+START = 1_600_000_000
+
+
+class Clock:
+    """a reproducible clock for RexDB's time_method, advanced by the benchmark"""
+
+    def __init__(self, now: int = START) -> None:
+        self.now = now
+
+    def gmtime(self):
+        return time.localtime(self.now)
+
+
+def make_schema(width: int):
+    fstring = ("ifd" * width)[:width]
+    fields = tuple(f"field{i}" for i in range(width))
+    row = tuple((i, i / 2, i / 3)[i % 3] for i in range(width))
+    return fstring, fields, row
+
+
+def percentiles(samples: list) -> dict:
+    samples = sorted(samples)
+
+    def at(fraction):
+        return samples[min(len(samples) - 1, int(fraction * len(samples)))] * 1e6
+
+    return {"p50_us": at(0.5), "p90_us": at(0.9), "p99_us": at(0.99), "max_us": samples[-1] * 1e6}
+
+
+def bench_layout(directory: str, rows: int, width: int, bytes_per_file: int, files_per_folder: int,
+                 args) -> dict:
+    fstring, fields, row = make_schema(width)
+    clock = Clock()
+    result = {"rows": rows, "width": width, "bytes_per_file": bytes_per_file,
+              "files_per_folder": files_per_folder}
+    with tempfile.TemporaryDirectory(dir=directory) as filepath:
+        db = RexDB(fstring, fields, bytes_per_file=bytes_per_file, files_per_folder=files_per_folder,
+                   time_method=clock.gmtime, filepath=filepath)
+
+        # log throughput over the first rows, the rest of the database is filled in batches
+        logged = min(rows, args.log_rows)
+        started = time.perf_counter()
+        for _ in range(logged):
+            db.log(row)
+            clock.now += 1
+        elapsed = time.perf_counter() - started
+        result["log_rows_per_s"] = logged / elapsed if logged else None
+
+        batched = rows - logged
+        started = time.perf_counter()
+        batch = [row] * args.batch_size
+        while logged < rows:
+            count = min(args.batch_size, rows - logged)
+            db.log_many(batch[:count], range(clock.now, clock.now + count))
+            clock.now += count
+            logged += count
+        elapsed = time.perf_counter() - started
+        result["log_many_rows_per_s"] = batched / elapsed if batched else None
+        db.close()
+
+        started = time.perf_counter()
+        db = RexDB(time_method=clock.gmtime, filepath=filepath, new_db=False)
+        result["reopen_s"] = time.perf_counter() - started
+
+        generator = random.Random(args.seed)
+        samples = []
+        for _ in range(args.point_queries):
+            t = time.localtime(START + generator.randrange(rows))
+            started = time.perf_counter()
+            db.get_data_at_time(t)
+            samples.append(time.perf_counter() - started)
+        result["point_query"] = percentiles(samples)
+
+        width_rows = min(rows, args.range_rows)
+        scanned = 0
+        started = time.perf_counter()
+        for _ in range(args.range_queries):
+            first = START + generator.randrange(rows - width_rows + 1)
+            scanned += len(db.get_data_at_range(time.localtime(first), time.localtime(first + width_rows - 1)))
+        elapsed = time.perf_counter() - started
+        result["range_rows_per_s"] = scanned / elapsed if elapsed else None
+
+        started = time.perf_counter()
+        scanned = len(db.get_data_at_range(time.localtime(START), time.localtime(START + rows - 1)))
+        elapsed = time.perf_counter() - started
+        result["full_scan_rows_per_s"] = scanned / elapsed if elapsed else None
+        db.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--widths", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--bytes-per-file", type=int, nargs="+", default=[1024, 65536])
+    parser.add_argument("--files-per-folder", type=int, nargs="+", default=[50])
+    parser.add_argument("--dir", default=None, help="directory to create databases in")
+    parser.add_argument("--log-rows", type=int, default=100000, help="rows logged one at a time with log")
+    parser.add_argument("--batch-size", type=int, default=10000, help="rows per log_many call for the rest")
+    parser.add_argument("--point-queries", type=int, default=1000)
+    parser.add_argument("--range-queries", type=int, default=20)
+    parser.add_argument("--range-rows", type=int, default=3600, help="rows in each range query")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="file to write the JSON results to")
+    args = parser.parse_args()
+
+    results = []
+    for rows, width, bytes_per_file, files_per_folder in itertools.product(
+            args.rows, args.widths, args.bytes_per_file, args.files_per_folder):
+        # progress goes to stderr so stdout stays valid JSON
+        print(f"rows={rows} width={width} bytes_per_file={bytes_per_file} files_per_folder={files_per_folder}",
+              file=sys.stderr)
+        results.append(bench_layout(args.dir, rows, width, bytes_per_file, files_per_folder, args))
+
+    report = {
+        "version": VERSION,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "settings": {key: value for key, value in vars(args).items() if key != "output"},
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output is None:
+        print(output)
+    else:
+        with open(args.output, "w") as fd:
+            fd.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from src.rexdb import RexDB
+
+
+class AsyncRexDB:
+    """
+    asyncio front end for a RexDB. Every file operation runs on a dedicated single thread
+    executor, so the event loop never blocks on the database and the database is only ever
+    used from one thread. Logged rows are timestamped when log is called and queued for a
+    single writer task, which writes everything queued so far with one log_many call.
+    """
+
+    def __init__(self, db: RexDB, batch_size: int = 1024, executor: ThreadPoolExecutor = None) -> None:
+        self.db = db
+        self.batch_size = batch_size
+        # only executors created here or by open are shut down on close
+        self._owns_executor = executor is None
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rexdb")
+        self._executor = executor
+        self._queue = None
+        self._writer = None
+
+    @classmethod
+    async def open(cls, *args, batch_size: int = 1024, **kwargs):
+        """
+        creates or reopens a RexDB on the executor, taking the same arguments as RexDB
+        """
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rexdb")
+        db = await asyncio.get_running_loop().run_in_executor(executor, lambda: RexDB(*args, **kwargs))
+        async_db = cls(db, batch_size, executor)
+        async_db._owns_executor = True
+        return async_db
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def run(self, function, *args):
+        """
+        runs function(*args) on the database executor
+        """
+        return await asyncio.get_running_loop().run_in_executor(self._executor, function, *args)
+
+    async def log(self, data: tuple) -> bool:
+        """
+        log: tuple -> bool
+        logs an entry stamped with the time of the call once the writer task has written it
+        """
+        return await self.enqueue([data], [self.db.now()])
+
+    async def log_many(self, rows, timestamps=None) -> bool:
+        """
+        log_many: tuple list * struct_time list -> bool
+        logs a batch of entries once the writer task has written them. If timestamps are not
+        given, every entry is stamped with the time of the call.
+        """
+        rows = list(rows)
+        if timestamps is None:
+            timestamps = [self.db.now()] * len(rows)
+        else:
+            timestamps = list(timestamps)
+            if len(timestamps) != len(rows):
+                raise ValueError("number of timestamps does not match number of rows")
+        return await self.enqueue(rows, timestamps)
+
+    async def enqueue(self, rows: list, timestamps: list) -> bool:
+        if self._writer is None:
+            self._queue = asyncio.Queue()
+            self._writer = asyncio.get_running_loop().create_task(self.write())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((rows, timestamps, future))
+        return await future
+
+    async def write(self):
+        """
+        the writer task, writes queued entries in batches of up to batch_size entries
+        """
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            items = [item]
+            count = len(item[0])
+            while count < self.batch_size and not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is None:
+                    # finish this batch and stop
+                    self._queue.put_nowait(None)
+                    break
+                items.append(item)
+                count += len(item[0])
+            await self.write_items(items)
+
+    async def write_items(self, items: list):
+        rows = [row for item in items for row in item[0]]
+        timestamps = [stamp for item in items for stamp in item[1]]
+        try:
+            success = await self.run(self.db.log_many, rows, timestamps)
+            for _, _, future in items:
+                if not future.done():
+                    future.set_result(success)
+        except Exception as e:
+            if len(items) == 1:
+                if not items[0][2].done():
+                    items[0][2].set_exception(e)
+                return
+            # log_many checks its input before writing anything, so the calls in the
+            # batch can be retried one at a time to fail only the ones at fault
+            for item in items:
+                await self.write_items([item])
+
+    async def get_data_at_time(self, t: time.struct_time, fields: tuple = None):
+        return await self.run(self.db.get_data_at_time, t, fields)
+
+    async def get_data_at_range(self, start_time: time.struct_time, end_time: time.struct_time,
+                                fields: tuple = None):
+        return await self.run(self.db.get_data_at_range, start_time, end_time, fields)
+
+    async def iter_range(self, start_time: time.struct_time, end_time: time.struct_time,
+                         chunk_size: int = 1024, fields: tuple = None):
+        """
+        asynchronously yields the entries falling within a range of time, reading one chunk
+        at a time on the executor
+        """
+        chunks = self.db.iter_chunks(start_time, end_time, chunk_size, fields)
+        try:
+            while (chunk := await self.run(next, chunks, None)) is not None:
+                for data in chunk:
+                    yield data
+        finally:
+            await self.run(chunks.close)
+
+    async def flush(self) -> bool:
+        return await self.run(self.db.flush)
+
+    async def close(self) -> bool:
+        """
+        waits for the writer task to write every queued entry, then closes the database
+        """
+        if self._writer is not None:
+            await self._queue.put(None)
+            await self._writer
+            self._writer = None
+        success = await self.run(self.db.close)
+        if self._owns_executor:
+            self._executor.shutdown()
+        return success
@@ -0,0 +1,29 @@
+"""
+Compacts an existing database, merging its sealed files into larger segments.
+
+Run from the repository root:
+    python -m src.compact filepath [segment_bytes] [folder_group]
+"""
+import os
+import sys
+
+from src.rexdb import RexDB
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        return 1
+    filepath = sys.argv[1]
+    segment_bytes = int(sys.argv[2]) if len(sys.argv) > 2 else 1 << 20
+    folder_group = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+    # readers that follow a published high-water mark are told about the compaction
+    publish_interval = 0 if os.path.exists(f"{filepath}/hwm") else None
+    with RexDB(filepath=filepath, new_db=False, publish_interval=publish_interval) as db:
+        removed = db.compact(segment_bytes, folder_group)
+    print(f"removed {removed} files")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
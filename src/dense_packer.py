@@ -1,4 +1,5 @@
 import struct
+from operator import itemgetter
 
 
 class DensePacker():
@@ -10,6 +11,14 @@ class DensePacker():
         self.dense_fstring = self.make_format(fstring)
         self.user_dense_map = self.create_pack_maps(self.user_fstring, self.dense_fstring)
         self.line_size = struct.calcsize(self.dense_fstring)
+        self.struct = struct.Struct(self.dense_fstring)
+        self.dense_user_map = self.invert_map(self.user_dense_map)
+        self._to_dense = self.make_permutation(self.user_dense_map)
+        self._to_user = self.make_permutation(self.dense_user_map)
+        # byte offset and struct of every user field within a dense line
+        self.field_offsets = [struct.calcsize(self.dense_fstring[:i]) for i in self.dense_user_map]
+        self.field_structs = [struct.Struct(c) for c in self.user_fstring]
+        self._projections = {}
 
     def create_pack_maps(self, user_fstring, dense_fstring) -> str:
         '''
@@ -21,7 +30,7 @@ class DensePacker():
             Notice how the "c" at index 3 comes before the "c" at
             index 1
         '''
-        pack_map = {"c": [], "?": [], "h": [], "i": [], "f": [], "Q": [], "d": []}
+        pack_map = {"c": [], "?": [], "h": [], "H": [], "i": [], "f": [], "Q": [], "d": []}
         length = len(user_fstring)
         # map from the user string to the dense string
         user_dense_map = [0] * length
@@ -32,30 +41,140 @@ class DensePacker():
 
         return user_dense_map
 
+    @staticmethod
+    def invert_map(pack_map: list) -> list:
+        '''
+        invert_map: int list -> int list
+        Creates the map from the dense_fstring back to the user_fstring.
+        For Example [2, 0, 3, 1] -> [1, 3, 0, 2]
+        '''
+        inverse = [0] * len(pack_map)
+        for i, index in enumerate(pack_map):
+            inverse[index] = i
+        return inverse
+
+    @staticmethod
+    def make_permutation(pack_map: list):
+        '''
+        make_permutation: int list -> (tuple -> tuple)
+        Compiles a map into a function that reorders a tuple so that the
+        item at index pack_map[i] ends up at index i.
+        '''
+        if pack_map == list(range(len(pack_map))):
+            return tuple
+        if len(pack_map) == 1:
+            index = pack_map[0]
+            return lambda data: (data[index],)
+        return itemgetter(*pack_map)
+
     def pack(self, data: tuple) -> bytes:
         '''
         pack: tuple -> bytes
         takes input in the user_format, converts it to data in dense_format
         and packs that data into bytes.
         '''
-        result = [0] * self.fstring_length
-        for i in range(self.fstring_length):
-            index = self.user_dense_map[i]
-            result[i] = data[index]
-        return struct.pack(self.dense_fstring, *result)
+        return self.struct.pack(*self._to_dense(data))
+
+    def pack_into(self, buffer, offset: int, data: tuple) -> None:
+        '''
+        pack_into: bytearray * int * tuple -> None
+        takes input in the user_format and packs it in dense_format into
+        buffer starting at offset.
+        '''
+        self.struct.pack_into(buffer, offset, *self._to_dense(data))
 
-    def unpack(self, data: bytes) -> tuple:
+    def pack_many(self, rows) -> bytearray:
+        '''
+        pack_many: tuple list -> bytearray
+        packs every row given in the user_format into one buffer of
+        consecutive dense_format lines.
+        '''
+        buffer = bytearray(len(rows) * self.line_size)
+        pack_into = self.struct.pack_into
+        to_dense = self._to_dense
+        offset = 0
+        for row in rows:
+            pack_into(buffer, offset, *to_dense(row))
+            offset += self.line_size
+        return buffer
+
+    def unpack(self, data: bytes, fields: tuple = None) -> tuple:
         '''
         unpack: bytes -> tuple
         takes input in the form of bytes and will unpack the data into a tuple
-        that is in the user_format
+        that is in the user_format. If fields are given, only the user fields
+        at those indices are unpacked, in the order given.
+        '''
+        if fields is None:
+            return self._to_user(self.struct.unpack(data))
+        codec, reorder = self.projection(fields)
+        return reorder(codec.unpack(data))
+
+    def unpack_many(self, data, fields: tuple = None) -> list:
+        '''
+        unpack_many: bytes -> tuple list
+        unpacks a buffer of consecutive dense_format lines into a list of
+        tuples in the user_format. Any trailing partial line is ignored.
+        fields are handled as in unpack.
+        '''
+        if fields is None:
+            codec, reorder = self.struct, self._to_user
+        else:
+            codec, reorder = self.projection(fields)
+        end = len(data) - (len(data) % self.line_size)
+        lines = codec.iter_unpack(memoryview(data)[:end])
+        if reorder is tuple:
+            return list(lines)
+        return list(map(reorder, lines))
+
+    def projection(self, fields: tuple):
+        '''
+        projection: int tuple -> Struct * (tuple -> tuple)
+        compiles a struct that decodes only the user fields at the given indices
+        from a dense_format line, skipping the bytes of every other field, and a
+        function that puts the decoded fields in the order requested.
+        '''
+        compiled = self._projections.get(fields)
+        if compiled is None:
+            fstring = ""
+            kept = []
+            skipped = 0
+            for position, c in enumerate(self.dense_fstring):
+                index = self.user_dense_map[position]
+                if index in fields:
+                    if skipped:
+                        fstring += f"{skipped}x"
+                        skipped = 0
+                    fstring += c
+                    kept.append(index)
+                else:
+                    skipped += struct.calcsize(c)
+            if skipped:
+                fstring += f"{skipped}x"
+            compiled = (struct.Struct(fstring), self.make_permutation([kept.index(index) for index in fields]))
+            self._projections[fields] = compiled
+        return compiled
+
+    def make_dtype(self, field_names: tuple) -> dict:
+        '''
+        make_dtype: str tuple -> dict
+        describes a dense_format line as a NumPy structured dtype with fields
+        in the user_format order. Field names that are missing or repeated
+        are replaced by their position.
         '''
-        result = [0] * self.fstring_length
-        unpacked_data = struct.unpack(self.dense_fstring, data)
+        numpy_formats = {"c": "S1", "?": "?", "h": "i2", "H": "u2", "i": "i4", "f": "f4", "d": "f8", "Q": "u8"}
+        names = []
         for i in range(self.fstring_length):
-            index = self.user_dense_map[i]
-            result[index] = unpacked_data[i]
-        return tuple(result)
+            name = field_names[i] if i < len(field_names) else ""
+            if not isinstance(name, str) or name == "" or name in names:
+                name = f"f{i}"
+            names.append(name)
+        return {
+            "names": names,
+            "formats": [numpy_formats[c] for c in self.user_fstring],
+            "offsets": list(self.field_offsets),
+            "itemsize": self.line_size,
+        }
 
     @staticmethod
     def make_format(fstring: str) -> str:
@@ -65,7 +184,7 @@ class DensePacker():
         the data type.
         icfc -> ficc
         '''
-        char_list = {"c": 1, "?": 0.1, "h": 2, "i": 4, "f": 4.1, "d": 8, "Q": 8.1}
+        char_list = {"c": 1, "?": 0.1, "h": 2, "H": 2.1, "i": 4, "f": 4.1, "d": 8, "Q": 8.1}
         denseFormat = list(fstring)
         try:
             denseFormat.sort(key=(lambda c: char_list[c]), reverse=True)
@@ -79,7 +198,7 @@ class DensePacker():
         calc_fstring_size: None -> int
         calculates and returns the size in bytes for self.fstring
         '''
-        char_list = {"c": 1, "?": 1, "h": 2, "i": 4, "f": 4, "Q": 8, "d": 8}
+        char_list = {"c": 1, "?": 1, "h": 2, "H": 2, "i": 4, "f": 4, "Q": 8, "d": 8}
         sum = 0
         for char in fstring:
             sum += char_list[char]
@@ -0,0 +1,66 @@
+from collections import OrderedDict
+
+
+class FileCache:
+    """
+    Least recently used cache of the contents of data files, keyed by file path and
+    bounded by the total number of bytes held. Sealed files never change, so they stay
+    cached until evicted, the file being written to is invalidated on every write.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._files = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    def get(self, path: str):
+        """
+        get: str -> bytes
+        returns the cached contents of a file, or None if it is not cached
+        """
+        data = self._files.get(path)
+        if data is None:
+            self.misses += 1
+            return None
+        self._files.move_to_end(path)
+        self.hits += 1
+        return data
+
+    def put(self, path: str, data: bytes) -> None:
+        """
+        put: str * bytes -> None
+        caches the contents of a file, evicting the least recently used files to make room.
+        Files larger than the whole cache are not cached.
+        """
+        self.invalidate(path)
+        if len(data) > self.max_bytes:
+            return
+        self._files[path] = data
+        self.used += len(data)
+        while self.used > self.max_bytes:
+            _, evicted = self._files.popitem(last=False)
+            self.used -= len(evicted)
+            self.evictions += 1
+
+    def invalidate(self, path: str) -> None:
+        data = self._files.pop(path, None)
+        if data is not None:
+            self.used -= len(data)
+
+    def clear(self) -> None:
+        self._files.clear()
+        self.used = 0
+
+    def stats(self) -> dict:
+        """
+        stats: None -> dict
+        returns the hit, miss and eviction counts and the number of files and bytes cached
+        """
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "files": len(self._files), "bytes": self.used}
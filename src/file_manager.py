@@ -1,6 +1,13 @@
+import io
+import lzma
 import struct
 import os
+import shutil
+import time
+import zlib
 from src.dense_packer import DensePacker
+from src.file_cache import FileCache
+from src.time_index import TimeIndex
 
 VERSION = "0.0.1"
 VERSION_BYTE = 0x00
@@ -9,6 +16,29 @@ UNSIGNED_CHAR = 'B'
 UNSIGNED_LONG_LONG = 'Q'
 FLOAT = 'f'
 
+# compression codecs for sealed data files, a codec's position is its id in db_info.info
+COMPRESSIONS = (None, "zlib", "lzma")
+CODECS = {"zlib": zlib, "lzma": lzma}
+# compressed data files start with this magic followed by the id of their codec
+COMPRESSED_MAGIC = b"RXZ"
+
+# entries of the index snapshot, (folder, file, start time, end time)
+SNAPSHOT_ENTRY = struct.Struct("qqqq")
+SNAPSHOT_FOLDER = struct.Struct("q")
+
+# the committed high-water mark published by a writer for its readers, (folder, file,
+# entries in the file, folder start time, file start time, generation). The generation
+# is bumped whenever folders are expired or compacted.
+HIGH_WATER_MARK = struct.Struct("qqqqqq")
+
+
+def print_error(message: str, e: Exception) -> None:
+    '''
+    print_error: str * Exception -> None
+    reports an error by printing it, used where no metrics are kept
+    '''
+    print(f"{message}: {e}")
+
 
 class FileManager:
     """
@@ -30,47 +60,142 @@ class FileManager:
         2 ints will not leave any padding
 
         version byte has 3 bytes of padding beforehand
+
+        the byte after the version byte holds the id of the compression codec of sealed files
         """
         length = len(data)
         index = 0
         version_byte = data[index + 3]
+        if data[index + 1] >= len(COMPRESSIONS):
+            raise ValueError(f"unknown compression codec: {data[index + 1]}")
+        compression = COMPRESSIONS[data[index + 1]]
         index += 4
-        init_time = (data[index + 3] << 24) + (data[index + 2] << 16) + (data[index + 1] << 8) + (data[index + 0])
-        index += 4
-        bytes_per_file = (data[index + 3] << 24) + (data[index + 2] << 16) + (data[index + 1] << 8) + (data[index + 0])
-        index += 4
-        files_per_folder = (data[index + 3] << 24) + (data[index + 2] << 16) + (data[index + 1] << 8) + data[index + 0]
-        index += 4
-        fstring_size = (data[index + 3] << 24) + (data[index + 2] << 16) + (data[index + 1] << 8) + (data[index + 0])
-        index += 4
-        fstring = ""
-        for i in range(fstring_size):
-            fstring += chr(data[index + i])
+        # every int is little endian, strings are one byte per character
+        init_time, bytes_per_file, files_per_folder, fstring_size = struct.unpack_from("<IIII", data, index)
+        index += 16
+        fstring = data[index:index + fstring_size].decode("latin-1")
         index += fstring_size
-        dense_fstring = ""
-        for i in range(fstring_size):
-            dense_fstring += chr(data[index + i])
+        dense_fstring = data[index:index + fstring_size].decode("latin-1")
         index += fstring_size + ((4 - ((fstring_size * 2) % 4)) % 4)
 
         fields = ()
         while index < length:
-            field_len = (data[index + 3] << 24) + (data[index + 2] << 16) + (data[index + 1] << 8) + (data[index + 0])
+            field_len = struct.unpack_from("<I", data, index)[0]
             index += 4
-            string = ""
-            for i in range(field_len):
-                string += chr(data[index + i])
-            fields += (string,)
+            fields += (data[index:index + field_len].decode("latin-1"),)
             index += field_len
             index += ((4 - (index % 4)) % 4)
-        return init_time, bytes_per_file, files_per_folder, version_byte, fstring_size, fstring, dense_fstring, fields
+        return (init_time, bytes_per_file, files_per_folder, version_byte, fstring_size, fstring, dense_fstring, fields,
+                compression)
+
+    @staticmethod
+    def search_file(fd, count: int, record_size: int, codec: struct.Struct, offset: int,
+                    t: float, after: bool = False) -> int:
+        """
+        search_file: file * int * int * Struct * int * float * bool -> int
+        Binary searches the first `count` fixed size records of an open file, sorted by a
+        time field decoded with codec at offset in each record, for the first record with
+        a time at or after t, or strictly after t if `after` is True. Only the time field
+        of each probed record is read. Returns `count` if there is no such record.
+        """
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            fd.seek(middle * record_size + offset)
+            probe = codec.unpack(fd.read(codec.size))[0]
+            if probe < t or (after and probe == t):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    @staticmethod
+    def compress(data: bytes, compression: str) -> bytes:
+        """
+        compress: bytes * str -> bytes
+        compresses the contents of a sealed data file behind a header naming the codec
+        """
+        return COMPRESSED_MAGIC + bytes([COMPRESSIONS.index(compression)]) + CODECS[compression].compress(data)
+
+    @staticmethod
+    def decompress(data: bytes, compression: str, line_size: int = None) -> bytes:
+        """
+        decompress: bytes * str * int -> bytes
+        decompresses the contents of a sealed data file. Compressed files are told apart
+        by their header, files without one were sealed without being compressed, for
+        example because of a power loss during rollover, and are returned as they are.
+        Raises ValueError if a compressed file does not decompress or, given the size of
+        an entry, if a raw file does not hold whole entries.
+        """
+        if compression is None:
+            return data
+        header = len(COMPRESSED_MAGIC) + 1
+        if data[:len(COMPRESSED_MAGIC)] == COMPRESSED_MAGIC:
+            codec = COMPRESSIONS[data[header - 1]] if data[header - 1] < len(COMPRESSIONS) else None
+            if codec is None:
+                raise ValueError(f"unknown codec id {data[header - 1]}")
+            try:
+                return CODECS[codec].decompress(data[header:])
+            except (zlib.error, lzma.LZMAError, EOFError) as e:
+                raise ValueError(f"corrupt compressed file: {e}")
+        if line_size is not None and len(data) % line_size:
+            raise ValueError("file does not hold whole entries")
+        return data
+
+    @staticmethod
+    def replace_file(path: str, data: bytes, sync: bool = False) -> None:
+        """
+        replace_file: str * bytes * bool -> None
+        replaces the contents of a file in one rename, so readers and power losses only
+        ever see the old or the new contents. If sync is True the new contents are forced
+        to disk before the rename, so the rename never points at unwritten data, and the
+        rename itself is forced to disk after it.
+        """
+        with open(f"{path}.tmp", "wb") as fd:
+            fd.write(data)
+            if sync:
+                fd.flush()
+                os.fsync(fd.fileno())
+        os.replace(f"{path}.tmp", path)
+        if sync:
+            FileManager.sync_directory(path)
+
+    @staticmethod
+    def sync_directory(path: str) -> None:
+        """
+        sync_directory: str -> None
+        forces the directory entries of the directory holding path to disk, so a file
+        created or renamed there survives a power loss
+        """
+        fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
 
     def __init__(self, fstring: str, field_names: tuple, bytes_per_file: int,
-                 files_per_folder: int, init_time: int, filepath: str, new_db: bool) -> None:
+                 files_per_folder: int, init_time: int, filepath: str, new_db: bool,
+                 buffer_size: int = 0, flush_interval: float = None, compression: str = None,
+                 cache_size: int = 0, readonly: bool = False, durable: bool = False) -> None:
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"unknown compression codec: {compression}")
+        self.compression = compression
+        # metadata is forced to disk before it is renamed into place
+        self.durable = durable
+        # a Metrics set by the database when instrumentation is enabled
+        self.metrics = None
+        # contents of recently read data files, only used when cache_size > 0
+        self.cache = FileCache(cache_size) if cache_size > 0 else None
         self.bytes_per_file = bytes_per_file
         self.db_num = 0
         self.fstring = fstring
         self.dense_fstring = DensePacker.make_format(self.fstring)
         self.fstring_size = DensePacker.calc_fstring_size(self.fstring)
+        # databases with nanosecond timestamps store times as long longs in the maps
+        self.time_format = "q" if self.fstring[0] == "Q" else "i"
+        self.scale = 1_000_000_000 if self.time_format == "q" else 1
+        self.map_entry = struct.Struct(self.time_format * 3)
+        self.temp_format = "ii" + self.time_format * 2
         self.lines_per_file = (self.bytes_per_file // self.fstring_size) + 1
         self.files_per_folder = files_per_folder
         self.init_time = init_time
@@ -82,17 +207,52 @@ class FileManager:
         self.filepath = filepath
         self.db_map = f"{self.filepath}/db_map.map"
         self.db_info = f"{self.filepath}/db_info.info"
+        self.snapshot = f"{self.filepath}/index.snap"
+        self.hwm = f"{self.filepath}/hwm"
+        # readers only see the entries of the current file below the last high-water mark
+        self.readonly = readonly
+        self.mark = None
+        self.records = 0
+        # bumped whenever sealed folders are expired or compacted, so readers know to reload
+        self.generation = 0
+        # write-behind buffer, only used when buffer_size > 0
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self._buffer = bytearray(buffer_size)
+        self._buffer_used = 0
+        self._buffer_started = 0.0
+        self._handle = None
+        # the last data file whose directory entry was forced to disk
+        self._linked = None
+        # in memory copies of db_map.map and the folder maps, folder maps are loaded on first use
+        self.db_index = TimeIndex(self.time_format)
+        self.folder_indexes = {}
+        # bytes on disk of sealed folders, measured on first use
+        self.folder_sizes = {}
         if new_db:
             self.setup()
+        elif readonly:
+            if not self.refresh():
+                raise RuntimeError("no database was initialized")
         else:
             self.read_setup()
 
+    def report(self, message: str, e: Exception) -> None:
+        '''
+        report: str * Exception -> None
+        prints an error and passes it on to the metrics hooks
+        '''
+        print_error(message, e)
+        if self.metrics is not None:
+            self.metrics.error(f"{message}: {e}")
+
     def setup(self):
         """
         runs all setup functions that are needed to create the file structure
         """
         try:
             self.create_db_map()
+            open(self.snapshot, "xb").close()
             self.create_new_folder()
             self.create_new_file()
             self.create_db_info()
@@ -107,15 +267,265 @@ class FileManager:
         try:
             with open(f"{self.filepath}/temp", "rb") as fd:
                 data = fd.read()
-            folders, files, folder_start_time, file_start_time = struct.unpack("iiii", data)
+            folders, files, folder_start_time, file_start_time = struct.unpack(self.temp_format, data)
             self.folders = folders
             self.files = files
             self.folder_start_time = folder_start_time
             self.file_start_time = file_start_time
             self.current_map = f"{self.filepath}/{self.folders}/.map"
+            self.current_file = self.file_path(self.folders, self.files)
+            self.db_index = TimeIndex.from_file(self.db_map, self.time_format)
         except Exception as e:
             print(f"could not get existing database: {e}")
             raise RuntimeError("no database was initialized")
+        try:
+            # carry on from the generation readers have seen
+            with open(self.hwm, "rb") as fd:
+                self.generation = HIGH_WATER_MARK.unpack(fd.read())[5]
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"could not read high-water mark: {e}")
+        self.check_snapshot()
+
+    def check_snapshot(self):
+        '''
+        check_snapshot: None -> None
+        makes sure the index snapshot holds every folder map entry. A power loss can only
+        leave out the last entries written, which belong to the current folder or the one
+        before it, so the snapshot is rebuilt from the folder maps if it is missing or
+        does not match the maps of those folders.
+        '''
+        if os.path.exists(self.snapshot):
+            for folder in (*self.db_index.nums[-1:], self.folders):
+                try:
+                    written = len(TimeIndex.from_file(f"{self.filepath}/{folder}/.map", self.time_format))
+                except FileNotFoundError:
+                    continue
+                if len(self.folder_index(folder)) != written:
+                    break
+            else:
+                return
+        self.rebuild_snapshot()
+        self.folder_indexes = {}
+
+    def rebuild_snapshot(self):
+        '''
+        rebuild_snapshot: None -> None
+        writes the index snapshot from every folder map, replacing it atomically
+        '''
+        entries = []
+        for folder in (*self.db_index.nums, self.folders):
+            try:
+                index = TimeIndex.from_file(f"{self.filepath}/{folder}/.map", self.time_format)
+            except Exception as e:
+                self.report(f"couldn't access folder map for {folder}", e)
+                continue
+            for i in range(len(index)):
+                entries.append(SNAPSHOT_ENTRY.pack(folder, index.nums[i], index.starts[i], index.ends[i]))
+        try:
+            self.replace_file(self.snapshot, b"".join(entries), self.durable)
+        except Exception as e:
+            self.report("could not write index snapshot", e)
+
+    def load_folder_indexes(self, first: int, last: int):
+        '''
+        load_folder_indexes: int * int -> None
+        loads the indexes of every folder from first to last that is not loaded yet from
+        the index snapshot, with two binary searches and one read. Folders without
+        entries get an empty index.
+        '''
+        indexes = {folder: TimeIndex(self.time_format) for folder in range(first, last + 1)
+                   if folder not in self.folder_indexes}
+        if not indexes:
+            return
+        size = SNAPSHOT_ENTRY.size
+        try:
+            with open(self.snapshot, "rb") as fd:
+                count = fd.seek(0, os.SEEK_END) // size
+                low = self.search_file(fd, count, size, SNAPSHOT_FOLDER, 0, first)
+                high = self.search_file(fd, count, size, SNAPSHOT_FOLDER, 0, last, after=True)
+                fd.seek(low * size)
+                data = fd.read((high - low) * size)
+        except Exception as e:
+            # folder_index falls back to the folder maps
+            self.report("could not read index snapshot", e)
+            return
+        for folder, file, start, end in SNAPSHOT_ENTRY.iter_unpack(data):
+            index = indexes.get(folder)
+            if index is not None and not (self.readonly and folder == self.folders and file >= self.files):
+                index.append(start, end, file)
+        self.folder_indexes.update(indexes)
+
+    def folder_index(self, folder: int) -> TimeIndex:
+        '''
+        folder_index: int -> TimeIndex
+        returns the index of a folder's map, loading it from the index snapshot, or
+        the folder's map file if there is no snapshot, the first time the folder is used.
+        '''
+        index = self.folder_indexes.get(folder)
+        if index is None:
+            self.load_folder_indexes(folder, folder)
+            index = self.folder_indexes.get(folder)
+        if index is None:
+            try:
+                index = TimeIndex.from_file(f"{self.filepath}/{folder}/.map", self.time_format)
+            except Exception as e:
+                self.report(f"couldn't access folder map for {folder}", e)
+                index = TimeIndex(self.time_format)
+            if self.readonly and folder == self.folders:
+                index.truncate(self.files)
+            self.folder_indexes[folder] = index
+        return index
+
+    def file_path(self, folder: int, file: int) -> str:
+        return f"{self.filepath}/{folder}/{file:05}.db"
+
+    def compression_of(self, path: str) -> str:
+        """
+        compression_of: str -> str
+        returns the codec a data file may be compressed with, the current file never is
+        """
+        return None if path == self.current_file else self.compression
+
+    def open_data(self, path: str):
+        """
+        open_data: str -> file
+        opens a data file for reading, sealed files of compressed databases are decompressed
+        into memory
+        """
+        compression = self.compression_of(path)
+        if self.readonly and path == self.current_file:
+            return io.BytesIO(self.read_committed())
+        if self.cache is None:
+            if self.metrics is not None:
+                self.metrics.count("files_opened")
+            if compression is None:
+                return open(path, "rb")
+            with open(path, "rb") as fd:
+                return io.BytesIO(self.decompress_file(path, fd.read(), compression))
+        data = self.cache.get(path)
+        if data is None:
+            if self.metrics is not None:
+                self.metrics.count("files_opened")
+            with open(path, "rb") as fd:
+                data = self.decompress_file(path, fd.read(), compression)
+            self.cache.put(path, data)
+        return io.BytesIO(data)
+
+    def decompress_file(self, path: str, data: bytes, compression: str, whole: bool = True) -> bytes:
+        '''
+        decompress_file: str * bytes * str * bool -> bytes
+        decompresses the contents of a data file, reporting it and raising ValueError if it
+        is corrupt. Raw files must hold whole entries unless whole is False.
+        '''
+        try:
+            return self.decompress(data, compression, self.fstring_size if whole else None)
+        except ValueError as e:
+            self.report(f"corrupt data file {path}", e)
+            raise
+
+    def read_committed(self) -> bytes:
+        '''
+        read_committed: None -> bytes
+        returns the entries of the current file below the high-water mark. The writer
+        may have sealed and compressed the file since the mark was published.
+        '''
+        if self.metrics is not None:
+            self.metrics.count("files_opened")
+        size = self.records * self.fstring_size
+        with open(self.current_file, "rb") as fd:
+            if self.compression is None:
+                return fd.read(size)
+            # the raw file may end in an entry being written
+            return self.decompress_file(self.current_file, fd.read(), self.compression, whole=False)[:size]
+
+    def read_data(self, path: str) -> bytes:
+        """
+        read_data: str -> bytes
+        returns the decompressed contents of a data file, files that were never
+        written to are empty
+        """
+        try:
+            with self.open_data(path) as fd:
+                return fd.read()
+        except FileNotFoundError:
+            return b""
+
+    def data_size(self, path: str) -> int:
+        """
+        data_size: str -> int
+        returns the number of bytes of entries in a data file
+        """
+        if self.compression_of(path) is not None:
+            return len(self.read_data(path))
+        try:
+            return os.path.getsize(path)
+        except FileNotFoundError:
+            return 0
+
+    def write_data(self, path: str, data: bytes) -> None:
+        """
+        write_data: str * bytes -> None
+        writes a sealed data file, compressed with the database's codec
+        """
+        if self.compression is not None:
+            data = self.compress(data, self.compression)
+        with open(path, "wb") as fd:
+            fd.write(data)
+            if self.durable:
+                fd.flush()
+                os.fsync(fd.fileno())
+        if self.durable:
+            self.sync_directory(path)
+
+    def replace_folder_map(self, folder: int, index: TimeIndex) -> None:
+        """
+        replace_folder_map: int * TimeIndex -> None
+        replaces the map of a sealed folder with index
+        """
+        self.replace_file(f"{self.filepath}/{folder}/.map", self.map_bytes(index), self.durable)
+        self.folder_indexes[folder] = index
+
+    def replace_db_map(self, index: TimeIndex) -> None:
+        """
+        replace_db_map: TimeIndex -> None
+        replaces the database map with index
+        """
+        self.replace_file(self.db_map, self.map_bytes(index), self.durable)
+        self.db_index = index
+
+    def map_bytes(self, index: TimeIndex) -> bytes:
+        """
+        map_bytes: TimeIndex -> bytes
+        returns the contents of a map file holding the entries of index
+        """
+        return b"".join(self.map_entry.pack(index.starts[i], index.ends[i], index.nums[i]) for i in range(len(index)))
+
+    def compress_file(self, path: str) -> bool:
+        """
+        compress_file: str -> bool
+        compresses a sealed data file in place. The compressed copy replaces the file in
+        one rename, so the file is always either fully raw or fully compressed.
+        """
+        if self.compression is None:
+            return True
+        try:
+            with open(path, "rb") as fd:
+                data = fd.read()
+        except FileNotFoundError:
+            return True
+        try:
+            if data[:len(COMPRESSED_MAGIC)] == COMPRESSED_MAGIC:
+                # already compressed before a power loss cut the rollover short
+                return True
+            self.replace_file(path, self.compress(data, self.compression), self.durable)
+            if self.cache is not None:
+                self.cache.invalidate(path)
+            return True
+        except Exception as e:
+            self.report("failed to compress file", e)
+            return False
 
     def create_db_map(self):
         try:
@@ -138,35 +548,140 @@ class FileManager:
             fields = fields + (len(field), bytes(field, 'utf-8'))
             self.info_format += f"i{len(field)}s"
 
-        data = struct.pack(self.info_format, VERSION_BYTE, self.init_time, self.bytes_per_file, self.files_per_folder,
-                           len(self.fstring), bytes(self.fstring, 'utf-8'),
-                           bytes(self.dense_fstring, 'utf-8'), *fields)
+        # the init time is always stored in seconds
+        data = bytearray(struct.pack(self.info_format, VERSION_BYTE, self.init_time // self.scale,
+                                     self.bytes_per_file, self.files_per_folder,
+                                     len(self.fstring), bytes(self.fstring, 'utf-8'),
+                                     bytes(self.dense_fstring, 'utf-8'), *fields))
+        # the codec goes in the padding after the version byte
+        data[1] = COMPRESSIONS.index(self.compression)
         try:
-            with open(self.db_info, "wb") as fd:
-                fd.write(data)
+            self.replace_file(self.db_info, bytes(data), self.durable)
         except Exception as e:
             print(f"failed to create db info: {e}")
 
     def write_temp_data_file(self):
-        packed_data = struct.pack("iiii", self.folders, self.files,
+        packed_data = struct.pack(self.temp_format, self.folders, self.files,
                                   int(self.folder_start_time),
                                   int(self.file_start_time))
-        with open(f"{self.filepath}/temp", "wb") as fd:
-            fd.write(packed_data)
+        self.replace_file(f"{self.filepath}/temp", packed_data, self.durable)
 
     def write_file(self, bytes_data: bytes) -> bool:
         '''
         write_file: bytes -> None
         Takes in data and writes it to the current file. Data should be formatted
         properly accoring to the fstring FileManager was given originally.
+        If a buffer_size was given, data is gathered in memory and written out
+        through a persistent handle once the buffer is full or too old.
         '''
+        if self.buffer_size > 0:
+            return self.buffer_write(bytes_data)
+        if self.cache is not None:
+            self.cache.invalidate(self.current_file)
         try:
             with open(self.current_file, "ab") as file:
                 file.write(bytes_data)
-                return True
         except Exception as e:
-            print(f"failed to write to file: {e}")
+            self.report("failed to write to file", e)
             return False
+        return self.link_current_file()
+
+    def buffer_write(self, bytes_data: bytes) -> bool:
+        '''
+        buffer_write: bytes -> bool
+        Copies data into the preallocated write buffer, flushing it when the
+        size or age threshold is reached.
+        '''
+        size = len(bytes_data)
+        if self._buffer_used + size > self.buffer_size:
+            if not self.flush():
+                return False
+            if size > self.buffer_size:
+                return self.write_handle(bytes_data)
+        if self._buffer_used == 0:
+            self._buffer_started = time.monotonic()
+        self._buffer[self._buffer_used:self._buffer_used + size] = bytes_data
+        self._buffer_used += size
+        if self._buffer_used >= self.buffer_size:
+            return self.flush()
+        if (self.flush_interval is not None
+                and time.monotonic() - self._buffer_started >= self.flush_interval):
+            return self.flush()
+        return True
+
+    def write_handle(self, bytes_data) -> bool:
+        '''
+        write_handle: bytes -> bool
+        Writes data to the current file through the persistent append handle,
+        opening it if needed.
+        '''
+        if self.cache is not None:
+            self.cache.invalidate(self.current_file)
+        try:
+            if self._handle is None:
+                self._handle = open(self.current_file, "ab", buffering=0)
+            self._handle.write(bytes_data)
+        except Exception as e:
+            self.report("failed to write to file", e)
+            return False
+        return self.link_current_file()
+
+    def link_current_file(self) -> bool:
+        '''
+        link_current_file: None -> bool
+        forces the directory entry of the current file to disk once it has been created,
+        if the database is durable, so its synced entries are not lost with the entry
+        '''
+        if not self.durable or self._linked == self.current_file:
+            return True
+        try:
+            self.sync_directory(self.current_file)
+            self._linked = self.current_file
+            return True
+        except Exception as e:
+            self.report("failed to sync directory", e)
+            return False
+
+    def flush(self) -> bool:
+        '''
+        flush: None -> bool
+        Writes any buffered data to the current file.
+        '''
+        if self._buffer_used == 0:
+            return True
+        success = self.write_handle(memoryview(self._buffer)[:self._buffer_used])
+        if success:
+            self._buffer_used = 0
+        return success
+
+    def sync(self) -> bool:
+        '''
+        sync: None -> bool
+        Flushes buffered data and forces the current file to stable storage with fsync.
+        '''
+        if not self.flush():
+            return False
+        try:
+            if self._handle is not None:
+                os.fsync(self._handle.fileno())
+            else:
+                with open(self.current_file, "ab") as fd:
+                    os.fsync(fd.fileno())
+            return True
+        except Exception as e:
+            self.report("failed to sync file", e)
+            return False
+
+    def close_file(self) -> bool:
+        '''
+        close_file: None -> bool
+        Flushes buffered data and closes the append handle of the current file.
+        '''
+        success = self.flush()
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+        return success
 
     def create_new_file(self) -> bool:
         '''
@@ -174,6 +689,7 @@ class FileManager:
         takes in a header. Iterates file count and creates a file with that new
         count as the name. Writes the header to the new file.
         '''
+        self.close_file()
         self.files += 1
         self.current_file = f'{self.filepath}/{self.folders}/{self.files:05}.db'
 
@@ -183,18 +699,28 @@ class FileManager:
         Iterates the folder count and updates the current file with that new
         folder value. Resets file count to 0.
         '''
+        self.close_file()
         self.files = 0
         self.folders += 1
         try:
-            os.mkdir(f'{self.filepath}/{self.folders}')
+            try:
+                os.mkdir(f'{self.filepath}/{self.folders}')
+            except FileExistsError:
+                # created by a rollover that a power loss cut short
+                pass
             self.current_file = f'{self.filepath}/{self.folders}/{self.files:05}.db'
             self.current_map = f'{self.filepath}/{self.folders}/.map'
+            self.folder_indexes[self.folders] = TimeIndex(self.time_format)
             try:
                 open(self.current_map, "wb")
             except Exception as e:
-                print(f"Failed to create folder map: {e}")
+                self.report("Failed to create folder map", e)
+            if self.durable:
+                # the new folder and its map survive a power loss
+                self.sync_directory(self.current_map)
+                self.sync_directory(f'{self.filepath}/{self.folders}')
         except Exception as e:
-            print(f"Failed to create new folder: {e}")
+            self.report("Failed to create new folder", e)
             return False
 
     def start_folder_entry(self, t):
@@ -204,6 +730,109 @@ class FileManager:
         self.file_start_time = t
         self.write_temp_data_file()
 
+    def publish(self, records: int) -> None:
+        '''
+        publish: int -> None
+        atomically replaces the high-water mark with the current file and the number of
+        its entries that are on disk, given the number logged to it. Every map entry of
+        the files before it has been written by the time a mark is published.
+        '''
+        mark = (self.folders, self.files, records - self._buffer_used // self.fstring_size,
+                int(self.folder_start_time), int(self.file_start_time), self.generation)
+        if mark == self.mark:
+            return
+        try:
+            self.replace_file(self.hwm, HIGH_WATER_MARK.pack(*mark))
+            self.mark = mark
+        except Exception as e:
+            self.report("could not publish high-water mark", e)
+
+    def read_mark(self) -> tuple:
+        '''
+        read_mark: None -> int * int * int * int * int * int
+        returns the high-water mark published by the writer. Databases whose writer does
+        not publish one are read as of their temp file, counting every whole entry of
+        the current file as committed, at generation 0.
+        '''
+        try:
+            with open(self.hwm, "rb") as fd:
+                return HIGH_WATER_MARK.unpack(fd.read())
+        except FileNotFoundError:
+            pass
+        with open(f"{self.filepath}/temp", "rb") as fd:
+            folders, files, folder_start_time, file_start_time = struct.unpack(self.temp_format, fd.read())
+        try:
+            records = os.path.getsize(self.file_path(folders, files)) // self.fstring_size
+        except FileNotFoundError:
+            records = 0
+        return folders, files, records, folder_start_time, file_start_time, 0
+
+    def refresh(self) -> bool:
+        '''
+        refresh: None -> bool
+        moves a reader up to the latest high-water mark. Only the database map entries
+        written since the last refresh are read, and only the folder indexes of the
+        folders written to since are dropped, to be loaded again on first use. If folders were
+        expired or compacted since, every index and cached file is dropped.
+        Returns False if the mark has not moved or could not be read.
+        '''
+        try:
+            mark = self.read_mark()
+        except Exception as e:
+            self.report("could not read high-water mark", e)
+            return False
+        if mark == self.mark:
+            return False
+        folders, files, records, folder_start_time, file_start_time, generation = mark
+        previous = self.folders
+        if generation != self.generation:
+            self.db_index = TimeIndex(self.time_format)
+            self.folder_indexes = {}
+            if self.cache is not None:
+                self.cache.clear()
+        try:
+            self.refresh_db_index(folders)
+        except Exception as e:
+            self.report("could not read database map", e)
+            return False
+        for folder in [folder for folder in self.folder_indexes if folder >= previous]:
+            del self.folder_indexes[folder]
+        self.folders = folders
+        self.files = files
+        self.records = records
+        self.folder_start_time = folder_start_time
+        self.file_start_time = file_start_time
+        self.current_map = f"{self.filepath}/{self.folders}/.map"
+        self.current_file = self.file_path(self.folders, self.files)
+        self.generation = generation
+        self.mark = mark
+        return True
+
+    def refresh_db_index(self, folders: int) -> None:
+        '''
+        refresh_db_index: int -> None
+        appends the database map entries of the folders before folders that are not in
+        the index yet. If folders were expired or compacted since the last refresh the
+        map was rewritten, and the index and every cache is loaded again.
+        '''
+        size = self.map_entry.size
+        known = len(self.db_index)
+        with open(self.db_map, "rb") as fd:
+            first = fd.read(size)
+            length = fd.seek(0, os.SEEK_END)
+            if known and (length < known * size or self.map_entry.unpack(first)[2] != self.db_index.nums[0]):
+                self.db_index = TimeIndex(self.time_format)
+                self.folder_indexes = {}
+                if self.cache is not None:
+                    self.cache.clear()
+                known = 0
+            fd.seek(known * size)
+            data = fd.read()
+        for start, end, num in self.map_entry.iter_unpack(data[:len(data) - len(data) % size]):
+            if num >= folders:
+                break
+            self.db_index.append(start, end, num)
+
     def write_to_folder_map(self, t):
         """
         write_to_folder_map: time: float -> success: bool
@@ -218,12 +847,39 @@ class FileManager:
 
         Written as Start Time, End Time, File Number
         """
+        if self.file_sealed():
+            return
+        # an entry never ends before it starts, even if the clock went back across a reopen
+        start = int(self.file_start_time)
+        end = max(int(t), start)
+        index = self.folder_index(self.folders)
+        index.append(start, end, self.files)
+        try:
+            self.replace_file(self.current_map, self.map_bytes(index), self.durable)
+        except Exception as e:
+            self.report("could not write to folder map", e)
         try:
-            with open(self.current_map, "ab") as fd:
-                data = struct.pack("iii", int(self.file_start_time), int(t), self.files)
-                fd.write(data)
+            with open(self.snapshot, "ab") as fd:
+                fd.write(SNAPSHOT_ENTRY.pack(self.folders, self.files, start, end))
         except Exception as e:
-            print(f"could not write to folder map: {e}")
+            self.report("could not write to index snapshot", e)
+
+    def file_sealed(self) -> bool:
+        '''
+        file_sealed: None -> bool
+        returns True if the current file is already in its folder map. The temp file is
+        renamed last during a rollover, so a power loss can leave it naming a file that
+        was sealed, which reopening seals again.
+        '''
+        index = self.folder_index(self.folders)
+        return len(index) > 0 and index.nums[-1] == self.files
+
+    def folder_sealed(self) -> bool:
+        '''
+        folder_sealed: None -> bool
+        returns True if the current folder is already in the database map
+        '''
+        return len(self.db_index) > 0 and self.db_index.nums[-1] == self.folders
 
     def start_db_entry(self, t):
         """
@@ -244,86 +900,130 @@ class FileManager:
         writes a struct of int (file number), float (start time),
         float (end time) to the map
         """
-        data = struct.pack("iii", int(self.folder_start_time), int(t), self.folders)
+        if self.folder_sealed():
+            return
+        start = int(self.folder_start_time)
+        end = max(int(t), start)
+        self.db_index.append(start, end, self.folders)
         try:
-            with open(self.db_map, "ab") as fd:
-                fd.write(data)
+            self.replace_file(self.db_map, self.map_bytes(self.db_index), self.durable)
         except Exception as e:
-            print(f"could not write to database map: {e}")
+            self.report("could not write to database map", e)
+
+    def folder_size(self, folder: int) -> int:
+        '''
+        folder_size: int -> int
+        returns the number of bytes the files of a folder take up. Sealed folders
+        never change, so their sizes are only measured once.
+        '''
+        size = self.folder_sizes.get(folder)
+        if size is None:
+            size = 0
+            try:
+                with os.scandir(f"{self.filepath}/{folder}") as entries:
+                    size = sum(entry.stat().st_size for entry in entries if entry.is_file())
+            except Exception as e:
+                self.report(f"could not measure folder {folder}", e)
+            if folder != self.folders:
+                self.folder_sizes[folder] = size
+        return size
+
+    def expire_folders(self, count: int) -> bool:
+        '''
+        expire_folders: int -> bool
+        deletes the oldest count sealed folders. The database map and the index
+        snapshot are rewritten without them first, each replaced in one rename, so a
+        power loss can at worst leave a deleted folder's files behind on disk.
+        '''
+        expired = self.db_index.nums[:count].tolist()
+        if not expired:
+            return True
+        try:
+            with open(self.db_map, "rb") as fd:
+                data = fd.read()[len(expired) * self.map_entry.size:]
+            self.replace_file(self.db_map, data, self.durable)
+            self.db_index = TimeIndex.from_bytes(data, self.time_format)
+
+            size = SNAPSHOT_ENTRY.size
+            with open(self.snapshot, "rb") as fd:
+                entries = fd.seek(0, os.SEEK_END) // size
+                first = self.search_file(fd, entries, size, SNAPSHOT_FOLDER, 0, expired[-1], after=True)
+                fd.seek(first * size)
+                data = fd.read()
+            self.replace_file(self.snapshot, data, self.durable)
+        except Exception as e:
+            self.report("could not expire folders", e)
+            return False
+
+        for folder in expired:
+            self.folder_indexes.pop(folder, None)
+            self.folder_sizes.pop(folder, None)
+            shutil.rmtree(f"{self.filepath}/{folder}", ignore_errors=True)
+        if self.cache is not None:
+            self.cache.clear()
+        self.generation += 1
+        return True
 
     def location_from_time(self, t: float) -> str:
         """
         returns file path for location given a time in the database
         REQUIRES: first entry time < t
         """
-        file = 1
-        folder = 1
-        found_folder = False
-        found_file = False
+        return self.file_path(*self.file_from_time(t))
 
-        # finding folder from DB_map
-        try:
-            with open(self.db_map, "rb") as fd:
-                while (data := fd.read(12)) and len(data) == 12:
-                    (start_time, end_time, num) = struct.unpack("iii", data)
-                    if (start_time <= t and t < end_time):
-                        folder = num
-                        found_folder = True
-                        break
-                if not found_folder:
-                    folder = self.folders
-        except Exception as e:
-            print(f"couldn't access db map: {e}")
+    def file_from_time(self, t: float) -> tuple:
+        """
+        file_from_time: float -> int * int
+        returns the (folder, file) numbers of the file holding entries logged at t
+        REQUIRES: first entry time < t
+        """
+        folder = self.db_index.find(t)
+        if folder is None:
+            folder = self.folders
+        file = self.folder_index(folder).find(t)
+        if file is None:
+            file = self.files
+        return folder, file
 
-        # finding file from folder_map
-        try:
-            with open(f"{self.filepath}/{folder}/.map", "rb") as fd:
-                while (data := fd.read(12)) and len(data) == 12:
-                    (start_time, end_time, num) = struct.unpack("iii", data)
-                    if (start_time <= t and t < end_time):
-                        file = num
-                        found_file = True
-                        break
-                if not found_file:
-                    file = self.files
-        except Exception as e:
-            print(f"couldn't access folder map: {e}")
+    def file_start(self, folder: int, file: int) -> int:
+        """
+        file_start: int * int -> int
+        returns the time the file was started at, which is at or before its first entry
+        """
+        if folder == self.folders and file == self.files:
+            return self.file_start_time
+        return self.folder_index(folder).start_of(file)
 
-        return f"{self.filepath}/{folder}/{file:05}.db"
+    def folders_from_range(self, start: float, end: float) -> list:
+        """
+        folders_from_range: float * float -> int list
+        returns the numbers of every folder that may hold entries between start and end
+        """
+        folders = self.db_index.overlapping(start, end)
+        if self.folder_start_time <= end:
+            folders.append(self.folders)
+        return folders
 
-    def locations_from_range(self, start: float, end: float):
-        folders = []
+    def files_from_range(self, start: float, end: float) -> list:
+        """
+        files_from_range: float * float -> (int * int) list
+        returns the (folder, file) numbers of every file that may hold entries
+        between start and end, in the order they were written
+        """
+        if self.metrics is not None:
+            started = time.perf_counter()
+        folders = self.folders_from_range(start, end)
+        if folders:
+            self.load_folder_indexes(folders[0], folders[-1])
         files = []
-        found_folder = False
-
-        try:
-            with open(self.db_map, "rb") as fd:
-                while (data := fd.read(12)) and len(data) == 12:
-                    (start_time, end_time, num) = struct.unpack("iii", data)
-                    if (start <= start_time <= end) or (start <= end_time <= end):
-                        found_folder = True
-                        folders.append(num)
-                if not found_folder:
-                    folders = [self.folders]
-                if end_time <= end:
-                    folders.append(self.folders)
-        except Exception as e:
-            print(f"couldn't access db map: {e}")
-
-        found_file = True
         for folder in folders:
-            try:
-                with open(f"{self.filepath}/{folder}/.map", "rb") as fd:
-                    while (data := fd.read(12)) and len(data) == 12:
-                        (start_time, end_time, num) = struct.unpack("iii", data)
-                        if (start <= start_time <= end) or (start <= end_time <= end):
-                            found_file = True
-                            files.append(f"{self.filepath}/{folder}/{num:05}.db")
-                    if not found_file:
-                        files = [f"{self.filepath}/{folder}/{self.files:05}.db"]
-                    if end_time <= end and folder == self.folders:
-                        files.append(f"{self.filepath}/{folder}/{self.files:05}.db")
-            except Exception as e:
-                print(f"couldn't access folder map for {folder}: {e}")
-
+            files.extend((folder, num) for num in self.folder_index(folder).overlapping(start, end))
+            if folder == self.folders and self.file_start_time <= end:
+                files.append((folder, self.files))
+        if self.metrics is not None:
+            self.metrics.count("map_scans")
+            self.metrics.time("map_scan_us", started)
         return files
+
+    def locations_from_range(self, start: float, end: float):
+        return [self.file_path(folder, file) for folder, file in self.files_from_range(start, end)]
@@ -0,0 +1,112 @@
+import time
+
+# values up to 2 ** (BUCKETS - 1) get their own bucket, larger values share the last one
+BUCKETS = 40
+
+
+class Histogram:
+    """
+    Distribution of non-negative values in power of two buckets, the value v falls
+    in bucket int(v).bit_length(). Percentiles are reported as the upper bound of the
+    bucket they fall in, so they are accurate to within a factor of two.
+    """
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+        self.buckets = [0] * BUCKETS
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self.buckets[min(int(value).bit_length(), BUCKETS - 1)] += 1
+
+    def percentile(self, fraction: float) -> float:
+        """
+        percentile: float -> float
+        returns the upper bound of the bucket holding the given fraction of values
+        """
+        rank = fraction * self.count
+        seen = 0
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= rank:
+                return min(float(1 << bucket), self.max)
+        return self.max
+
+    def snapshot(self) -> dict:
+        if self.count == 0:
+            return {"count": 0}
+        return {"count": self.count, "total": self.total, "mean": self.total / self.count,
+                "min": self.min, "max": self.max, "p50": self.percentile(0.5),
+                "p90": self.percentile(0.9), "p99": self.percentile(0.99)}
+
+
+class Metrics:
+    """
+    Counters and histograms of what a database spends its time on. Latencies are
+    recorded in microseconds under names ending in _us. Hooks are called with the
+    name and value of every count, observation and error as they happen, errors
+    are reported under the name "error" with their message as the value.
+
+    A database without metrics never creates one, so instrumentation costs a single
+    None check per instrumented call when it is disabled.
+    """
+
+    def __init__(self) -> None:
+        self.counters = {}
+        self.histograms = {}
+        self.hooks = []
+
+    def add_hook(self, hook) -> None:
+        """
+        add_hook: (str * any -> None) -> None
+        registers a function to call with the name and value of every event
+        """
+        self.hooks.append(hook)
+
+    def remove_hook(self, hook) -> None:
+        self.hooks.remove(hook)
+
+    def count(self, name: str, amount: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + amount
+        for hook in self.hooks:
+            hook(name, amount)
+
+    def observe(self, name: str, value: float) -> None:
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = Histogram()
+        histogram.add(value)
+        for hook in self.hooks:
+            hook(name, value)
+
+    def time(self, name: str, started: float) -> None:
+        """
+        time: str * float -> None
+        records the microseconds since started, a time.perf_counter() reading
+        """
+        self.observe(name, (time.perf_counter() - started) * 1e6)
+
+    def error(self, message: str) -> None:
+        self.counters["errors"] = self.counters.get("errors", 0) + 1
+        for hook in self.hooks:
+            hook("error", message)
+
+    def stats(self) -> dict:
+        """
+        stats: None -> dict
+        returns a snapshot of every counter and a summary of every histogram
+        """
+        return {"counters": dict(self.counters),
+                "histograms": {name: histogram.snapshot() for name, histogram in self.histograms.items()}}
+
+    def reset(self) -> None:
+        self.counters = {}
+        self.histograms = {}
@@ -1,6 +1,22 @@
+import io
+import os
+import operator
+import shutil
 import time
+from bisect import bisect_left, bisect_right
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
 from src.dense_packer import DensePacker
 from src.file_manager import FileManager
+from src.metrics import Metrics
+from src.rollup import Rollup
+from src.time_index import TimeIndex
+from src.zone_map import ZoneMap, OPERATORS
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 VERSION = "0.0.1"
 VERSION_BYTE = 0x00
@@ -8,17 +24,74 @@ VERSION_BYTE = 0x00
 UNSIGNED_CHAR = 'B'
 UNSIGNED_LONG_LONG = 'Q'
 FLOAT = 'f'
+# largest timestamp delta an "H" field holds
+MAX_DELTA = 0xFFFF
+
+# when logged entries are forced to disk with fsync
+DURABILITIES = ("none", "record", "batch", "rollover")
+
+
+def restore_times(rows: list, base: int, indexes: tuple = None) -> list:
+    """
+    restore_times: tuple list * int * int tuple -> tuple list
+    Adds the base time of a file back onto the delta encoded timestamps of its entries.
+    indexes are the fields the entries were decoded with, as in DensePacker.unpack_many.
+    """
+    positions = [0] if indexes is None else [i for i, index in enumerate(indexes) if index == 0]
+    for i in positions:
+        rows = [row[:i] + (row[i] + base,) + row[i + 1:] for row in rows]
+    return rows
+
+
+def read_entries(filepath: str, fstring: str, start: float, end: float, indexes: tuple = None,
+                 base: int = 0, compression: str = None) -> list:
+    """
+    read_entries: str * str * float * float * int tuple * int * str -> tuple list
+    Reads the entries of one data file falling between start and end. base is the time the
+    timestamps of the file are relative to and compression the codec it may be compressed with.
+    This is a module level function so that it can be sent to the workers of a process pool.
+    If the file cannot be read the error is returned, so the caller can report it.
+    """
+    packer = _packers.get(fstring)
+    if packer is None:
+        packer = _packers[fstring] = DensePacker(fstring)
+    line_size = packer.line_size
+    timestamp, offset = packer.field_structs[0], packer.field_offsets[0]
+    try:
+        with open(filepath, "rb") as raw:
+            fd = raw if compression is None else io.BytesIO(FileManager.decompress(raw.read(), compression, line_size))
+            lines = fd.seek(0, os.SEEK_END) // line_size
+            line = FileManager.search_file(fd, lines, line_size, timestamp, offset, start - base)
+            last = FileManager.search_file(fd, lines, line_size, timestamp, offset, end - base, after=True)
+            fd.seek(line * line_size)
+            rows = packer.unpack_many(fd.read((last - line) * line_size), indexes)
+            return restore_times(rows, base, indexes) if base else rows
+    except Exception as e:
+        return e
+
+
+# packers used by read_entries, one per format string
+_packers = {}
 
 
 class RexDB:
     def __init__(self, fstring: str = None, field_names: tuple = None, bytes_per_file=1024,
                  files_per_folder=50, time_method=time.gmtime, filepath: str = "",
-                 new_db: bool = True):
-        # add "i" as time will not be input by caller
+                 new_db: bool = True, buffer_size: int = 0, flush_interval: float = None,
+                 rollup_buckets: tuple = (), zone_maps: bool = False, high_resolution: bool = False,
+                 delta_timestamps: bool = False, compression: str = None, cache_size: int = 0,
+                 max_age: float = None, max_bytes: int = None, max_folders: int = None, metrics=None,
+                 publish_interval: float = None, readonly: bool = False, durability: str = "none",
+                 sync_records: int = None, sync_ms: float = None):
+        # add "i" as time will not be input by caller, "Q" for nanosecond timestamps or "H"
+        # for timestamps stored relative to the start time of their file
         self._timer_function = time_method
+        if readonly and new_db:
+            raise ValueError("only existing databases can be opened readonly")
         if new_db:
-            f_string = "i" + fstring
-            init_time = time.mktime(self._timer_function())
+            if high_resolution and delta_timestamps:
+                raise ValueError("delta timestamps are not supported with high resolution")
+            f_string = ("Q" if high_resolution else "H" if delta_timestamps else "i") + fstring
             field_names = ("timestamp", *field_names)
             if filepath != "":
                 self.check_filepath(filepath)
@@ -27,25 +100,124 @@ class RexDB:
                 data = file.read()
             (init_time, bytes_per_file, files_per_folder,
              VERSION_BYTE, fstring_length, f_string,
-             dense_fstring, field_names) = FileManager.unpack_db_info(data)
+             dense_fstring, field_names, compression) = FileManager.unpack_db_info(data)
+
+        # timestamps are counted in seconds, or in nanoseconds in high resolution databases
+        self._scale = 1_000_000_000 if f_string[0] == "Q" else 1
+        self._delta = f_string[0] == "H"
+        if self._scale != 1 and time_method is time.gmtime:
+            self._timer_function = time.time_ns
+        init_time = self.now() if new_db else init_time * self._scale
+
+        for limit in (max_age, max_bytes, max_folders):
+            if limit is not None and limit <= 0:
+                raise ValueError("retention limits must be positive")
+        self._max_age = max_age
+        self._max_bytes = max_bytes
+        self._max_folders = max_folders
+        if durability not in DURABILITIES:
+            raise ValueError(f"unknown durability: {durability}")
+        if durability == "batch" and sync_records is None and sync_ms is None:
+            raise ValueError("batch durability needs sync_records or sync_ms")
+        for limit in (sync_records, sync_ms):
+            if limit is not None and limit <= 0:
+                raise ValueError("sync limits must be positive")
+        self._durability = durability
+        self._sync_records = sync_records
+        self._sync_ms = sync_ms
+        self._unsynced = 0
+        self._synced = time.monotonic()
+        # readers never write, writers publish a high-water mark for them if given an interval
+        self._readonly = readonly
+        self._publish_interval = publish_interval
+        self._published = time.monotonic()
 
         self._field_names = field_names
         self._cursor = 0
         self._init_time = init_time
-        self._prev_timestamp = time.mktime(self._timer_function())
-        self._timestamp = int(self._prev_timestamp)
+        self._prev_timestamp = self.now()
+        self._timestamp = self._prev_timestamp
         self._packer = DensePacker(f_string)
         self._file_manager = FileManager(f_string, self._field_names, bytes_per_file,
                                          files_per_folder, int(self._init_time), filepath,
-                                         new_db)
+                                         new_db, buffer_size, flush_interval, compression, cache_size, readonly,
+                                         durability != "none")
+        # metrics is True for a new Metrics, or an existing one to share it between databases
+        self._metrics = Metrics() if metrics is True else metrics or None
+        self._file_manager.metrics = self._metrics
+        if not new_db:
+            rollup_buckets = Rollup.find_buckets(filepath)
+        elif rollup_buckets:
+            os.mkdir(f"{filepath}/rollups")
+        self._rollups = {}
+        for bucket in rollup_buckets:
+            self._rollups[int(bucket)] = Rollup(bucket, f_string, filepath, new_db, self._scale,
+                                                self._file_manager.report)
+        if not new_db:
+            zone_maps = ZoneMap.exists(filepath, self._file_manager.folders)
+        self._zone_map = ZoneMap(f_string, filepath, self._file_manager.report) if zone_maps else None
+        if new_db and zone_maps:
+            self._zone_map.create(self._file_manager.folders)
+        if readonly:
+            return
         if not new_db:
             self.hande_file_change()
+        else:
+            self.publish()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     def check_filepath(sef, filepath):
         """last character of filepath should be '/' as to ensure the proper folder"""
         if filepath[-1] == "/":
             raise RuntimeError("filepath should not end in '/'")
 
+    def to_timestamp(self, t):
+        """
+        to_timestamp: struct_time -> int
+        converts a time into a timestamp in the resolution of the database. A struct_time or a
+        float is a time in seconds, an int is taken to already be a timestamp, which is seconds
+        or nanoseconds since the epoch depending on the resolution of the database.
+        """
+        if isinstance(t, time.struct_time):
+            return int(time.mktime(t)) * self._scale
+        if isinstance(t, float):
+            return t * self._scale
+        return t
+
+    def now(self) -> int:
+        """
+        now: None -> int
+        the current timestamp according to the database's time method
+        """
+        return int(self.to_timestamp(self._timer_function()))
+
+    def last_timestamp(self) -> int:
+        """
+        last_timestamp: None -> int
+        the timestamp of the last logged entry, or of when the database was opened
+        """
+        return self._prev_timestamp
+
+    def check_row(self, data: tuple) -> None:
+        """
+        check_row: tuple -> None
+        packs an entry without logging it, raising ValueError if it does not match the
+        format of the database
+        """
+        try:
+            self._packer.pack((0, *data))
+        except Exception as e:
+            raise ValueError(f"invalid entry {data}: {e}")
+
+    def check_writable(self) -> None:
+        if self._readonly:
+            raise RuntimeError("database was opened readonly")
+
     def log(self, data) -> bool:
         """
         log: bytes -> bool
@@ -53,96 +225,872 @@ class RexDB:
         folders and files need to be created. Returns True if the data was
         successfully logged, False otherwise.
         """
-        self._timestamp = (int)(time.mktime(self._timer_function()))
+        self.check_writable()
+        metrics = self._metrics
+        if metrics is not None:
+            started = time.perf_counter()
+        self._timestamp = self.now()
 
         if (self._timestamp < self._prev_timestamp):
             raise ValueError("logging backwards in time")
 
-        if self._cursor >= self._file_manager.lines_per_file:
+        if self._cursor >= self._file_manager.lines_per_file or self.delta_overflows(self._timestamp):
             self.hande_file_change()
 
-        data_bytes = self._packer.pack((self._timestamp, *data))
+        if metrics is not None:
+            packing = time.perf_counter()
+        row = (self._timestamp, *data)
+        if self._delta:
+            data_bytes = self._packer.pack((self._timestamp - self._file_manager.file_start_time, *data))
+        else:
+            data_bytes = self._packer.pack(row)
+        if metrics is not None:
+            metrics.time("pack_us", packing)
         success = self._file_manager.write_file(data_bytes)
+        for rollup in self._rollups.values():
+            rollup.update(self._timestamp, row)
         self._cursor += 1
         self._prev_timestamp = self._timestamp
+        self.commit(1)
+        if self._publish_interval is not None and time.monotonic() - self._published >= self._publish_interval:
+            self.publish()
+        if metrics is not None:
+            metrics.count("rows_logged")
+            metrics.time("log_us", started)
+        return success
+
+    def log_many(self, rows, timestamps=None) -> bool:
+        """
+        log_many: tuple list * struct_time list -> bool
+        logs a batch of rows. If timestamps are not given, every row is logged with
+        the current time. Timestamps are converted as in to_timestamp. Rows are packed
+        into one buffer and written with one write per file they fall into. Returns True
+        if all rows were successfully logged, False otherwise.
+        """
+        self.check_writable()
+        count = len(rows)
+        if count == 0:
+            return True
+        metrics = self._metrics
+        if metrics is not None:
+            started = time.perf_counter()
+        if timestamps is None:
+            stamps = [self.now()] * count
+        else:
+            stamps = [int(self.to_timestamp(t)) for t in timestamps]
+            if len(stamps) != count:
+                raise ValueError("number of timestamps does not match number of rows")
+
+        if stamps[0] < self._prev_timestamp or not all(map(operator.le, stamps, islice(stamps, 1, None))):
+            raise ValueError("logging backwards in time")
+
+        line_size = self._packer.line_size
+        rows = [(stamp, *row) for stamp, row in zip(stamps, rows)]
+        view = None if self._delta else memoryview(self._packer.pack_many(rows))
+
+        # plan where files change and pack every segment before writing anything, so a
+        # row that cannot be packed leaves the database untouched. Delta encoded rows
+        # depend on the start time of the file they land in, so they are packed per file.
+        lines_per_file = self._file_manager.lines_per_file
+        segments = []
+        cursor = self._cursor
+        base = self._file_manager.file_start_time
+        index = 0
+        while index < count:
+            rollover = cursor >= lines_per_file or (self._delta and stamps[index] - base > MAX_DELTA)
+            if rollover:
+                # a new file starts at the time of its first row
+                cursor = 0
+                base = stamps[index]
+            lines = min(count - index, lines_per_file - cursor)
+            if self._delta:
+                lines = bisect_right(stamps, base + MAX_DELTA, index, index + lines) - index
+                data = self._packer.pack_many([(row[0] - base, *row[1:]) for row in rows[index:index + lines]])
+            else:
+                data = view[index * line_size:(index + lines) * line_size]
+            segments.append((rollover, stamps[index], lines, data))
+            cursor += lines
+            index += lines
+
+        for rollup in self._rollups.values():
+            rollup.update_many(stamps, rows)
+        success = True
+        for rollover, first, lines, data in segments:
+            if rollover:
+                self._timestamp = first
+                self.hande_file_change()
+            success = self._file_manager.write_file(data) and success
+            self._cursor += lines
+
+        self._timestamp = stamps[-1]
+        self._prev_timestamp = self._timestamp
+        self.commit(count)
+        if self._publish_interval is not None and time.monotonic() - self._published >= self._publish_interval:
+            self.publish()
+        if metrics is not None:
+            metrics.count("rows_logged", count)
+            metrics.time("log_many_us", started)
+        return success
+
+    def delta_overflows(self, timestamp: int) -> bool:
+        """
+        returns True if timestamp is too far past the start of the current file to be stored
+        as a delta, in which case a new file has to be started
+        """
+        return self._delta and timestamp - self._file_manager.file_start_time > MAX_DELTA
+
+    def file_base(self, folder: int, file: int) -> int:
+        """
+        file_base: int * int -> int
+        returns the time the timestamps of a file are relative to, 0 unless delta encoded
+        """
+        return self._file_manager.file_start(folder, file) if self._delta else 0
+
+    def cache_stats(self) -> dict:
+        """
+        cache_stats: None -> dict
+        returns the hits, misses and evictions of the file cache and the number of files and
+        bytes it holds, or None if the database has no cache
+        """
+        if self._file_manager.cache is None:
+            return None
+        return self._file_manager.cache.stats()
+
+    def flush(self) -> bool:
+        """
+        flush: None -> bool
+        writes any buffered entries to disk. Returns True if all buffered data
+        was written, False otherwise.
+        """
+        if self._readonly:
+            return True
+        success = self._file_manager.flush()
+        self.publish()
+        return success
+
+    def sync(self) -> bool:
+        """
+        sync: None -> bool
+        writes any buffered entries to disk and waits for the current file to reach stable
+        storage. Returns True if it did.
+        """
+        if self._readonly:
+            return True
+        success = self._file_manager.sync()
+        self._unsynced = 0
+        self._synced = time.monotonic()
+        self.publish()
+        return success
+
+    def commit(self, rows: int) -> None:
+        """
+        commit: int -> None
+        forces entries to disk after rows were logged, as often as the durability policy asks
+        """
+        if self._durability == "record":
+            self.sync()
+        elif self._durability == "batch":
+            self._unsynced += rows
+            if ((self._sync_records is not None and self._unsynced >= self._sync_records)
+                    or (self._sync_ms is not None and (time.monotonic() - self._synced) * 1000 >= self._sync_ms)):
+                self.sync()
+
+    def publish(self) -> None:
+        """
+        publish: None -> None
+        publishes the entries written to disk so far to readers, if the database was
+        opened with a publish_interval
+        """
+        if self._publish_interval is None:
+            return
+        self._file_manager.publish(self._cursor)
+        self._published = time.monotonic()
+
+    def refresh(self) -> bool:
+        """
+        refresh: None -> bool
+        catches a reader up with the entries its writer has published since it was opened
+        or last refreshed. Returns True if anything new was published.
+        """
+        if not self._readonly:
+            return False
+        previous = self._file_manager.folders
+        generation = self._file_manager.generation
+        if not self._file_manager.refresh():
+            return False
+        if self._zone_map is not None:
+            if self._file_manager.generation != generation:
+                self._zone_map.folders.clear()
+            for folder in [folder for folder in self._zone_map.folders if folder >= previous]:
+                del self._zone_map.folders[folder]
+        for rollup in self._rollups.values():
+            rollup.load_state()
+        return True
+
+    def close(self) -> bool:
+        """
+        close: None -> bool
+        flushes buffered entries and closes the open data file, forcing it to disk
+        first unless durability is "none". The database can still be logged to after
+        closing, the file is reopened on demand.
+        """
+        if self._readonly:
+            return True
+        for rollup in self._rollups.values():
+            rollup.save_state()
+        success = True
+        if self._durability != "none":
+            success = self.sync()
+        success = self._file_manager.close_file() and success
+        self.publish()
         return success
 
     def hande_file_change(self):
-        self._file_manager.write_to_folder_map(self._timestamp)
+        if self._metrics is not None:
+            started = time.perf_counter()
+        for rollup in self._rollups.values():
+            rollup.save_state()
+        if self._durability == "none":
+            self._file_manager.flush()
+        else:
+            # a sealed file is on disk before any map refers to it
+            self.timed("sync_us", self._file_manager.sync)
+            self._unsynced = 0
+            self._synced = time.monotonic()
+        # a rollover cut short by a power loss may have sealed the file already
+        sealed = self._file_manager.file_sealed()
+        self.timed("folder_map_write_us", self._file_manager.write_to_folder_map, self._timestamp)
+        if self._zone_map is not None and not sealed:
+            self.timed("seal_zone_us", self.seal_zone)
+        if self._file_manager.compression is not None:
+            self._file_manager.close_file()
+            self.timed("compress_us", self._file_manager.compress_file, self._file_manager.current_file)
         if self._file_manager.files >= self._file_manager.files_per_folder:
             # if no more files can be written in a folder, make new folder
-            self._file_manager.write_to_db_map(self._timestamp)
-            self._file_manager.create_new_folder()
+            self.timed("db_map_write_us", self._file_manager.write_to_db_map, self._timestamp)
+            self.timed("create_folder_us", self._file_manager.create_new_folder)
+            if self._zone_map is not None:
+                self._zone_map.create(self._file_manager.folders)
             self._file_manager.start_db_entry(self._timestamp)
+            self.timed("retention_us", self.apply_retention)
         # if no more lines can be written in a file, make new file
         self._file_manager.create_new_file()
         self._file_manager.start_folder_entry(self._timestamp)
         self._cursor = 0
+        self.publish()
+        if self._metrics is not None:
+            self._metrics.count("rollovers")
+            self._metrics.time("rollover_us", started)
+
+    def timed(self, name: str, function, *args):
+        """
+        calls function(*args), recording how long it took under name if metrics are enabled
+        """
+        if self._metrics is None:
+            return function(*args)
+        started = time.perf_counter()
+        result = function(*args)
+        self._metrics.time(name, started)
+        return result
+
+    def query_started(self):
+        """
+        returns what the cost of a query is measured from, or None if metrics are disabled
+        """
+        if self._metrics is None:
+            return None
+        counters = self._metrics.counters
+        return time.perf_counter(), counters.get("files_opened", 0), counters.get("bytes_read", 0)
+
+    def query_finished(self, name: str, started) -> None:
+        """
+        records the latency, files opened and bytes read of a query started with query_started
+        """
+        if started is None:
+            return
+        counters = self._metrics.counters
+        self._metrics.count("queries")
+        self._metrics.time(f"{name}_us", started[0])
+        self._metrics.observe("files_per_query", counters.get("files_opened", 0) - started[1])
+        self._metrics.observe("bytes_per_query", counters.get("bytes_read", 0) - started[2])
+
+    def read_bytes(self, count: int) -> None:
+        if self._metrics is not None:
+            self._metrics.count("bytes_read", count)
+
+    def stats(self) -> dict:
+        """
+        stats: None -> dict
+        returns a snapshot of the database's counters and histograms, along with the file
+        cache statistics if there is a cache. Returns None if metrics are disabled.
+        """
+        if self._metrics is None:
+            return None
+        stats = self._metrics.stats()
+        if self._file_manager.cache is not None:
+            stats["cache"] = self._file_manager.cache.stats()
+        return stats
+
+    def apply_retention(self) -> int:
+        """
+        apply_retention: None -> int
+        deletes the oldest sealed folders that fall outside max_age, max_bytes or
+        max_folders, whole folders at a time. The folder being written to is never
+        deleted. Returns the number of folders deleted.
+        """
+        manager = self._file_manager
+        index = manager.db_index
+        count = 0
+        if self._max_folders is not None:
+            count = max(count, len(index) + 1 - self._max_folders)
+        if self._max_age is not None:
+            # folders that ended before the cutoff
+            count = max(count, bisect_left(index.ends, self._timestamp - self._max_age * self._scale))
+        if self._max_bytes is not None:
+            sizes = [manager.folder_size(folder) for folder in index.nums]
+            total = sum(sizes) + manager.folder_size(manager.folders)
+            expired = 0
+            while expired < len(sizes) and total > self._max_bytes:
+                total -= sizes[expired]
+                expired += 1
+            count = max(count, expired)
+        count = min(count, len(index))
+        if count > 0:
+            expired = index.nums[:count].tolist()
+            manager.expire_folders(count)
+            if self._zone_map is not None:
+                for folder in expired:
+                    self._zone_map.folders.pop(folder, None)
+        return count
+
+    def compact(self, segment_bytes: int = 1 << 20, folder_group: int = 1) -> int:
+        """
+        compact: int * int -> int
+        merges the sealed files of every folder_group consecutive sealed folders into segment
+        files of up to segment_bytes bytes, kept in the first folder of each group. The folder
+        being written to is left alone. Segments are written under new file numbers and each
+        map is replaced in one rename before the files it no longer refers to are deleted, so
+        queries stay correct while the database is compacted. Returns the number of files
+        removed.
+        """
+        if segment_bytes <= 0 or folder_group <= 0:
+            raise ValueError("segment_bytes and folder_group must be positive")
+        self.check_writable()
+        self.flush()
+        manager = self._file_manager
+        sealed = manager.db_index
+        db_index = TimeIndex(manager.time_format)
+        replaced = []
+        emptied = []
+        written = 0
+        for first in range(0, len(sealed), folder_group):
+            group = sealed.nums[first:first + folder_group].tolist()
+            db_index.append(sealed.starts[first], sealed.ends[first + len(group) - 1], group[0])
+            files = []
+            for folder in group:
+                index = manager.folder_index(folder)
+                files.extend(zip([folder] * len(index), index.nums, index.starts, index.ends))
+            segments = self.plan_segments(files, segment_bytes)
+            if len(group) == 1 and len(segments) == len(files):
+                continue
+            target = group[0]
+            index = TimeIndex(manager.time_format)
+            zones = {}
+            num = max(manager.folder_index(target).nums, default=0) + 1
+            for segment in segments:
+                self.write_segment(manager.file_path(target, num), segment)
+                index.append(segment[0][2], segment[-1][3], num)
+                if self._zone_map is not None:
+                    zone = self.merge_zones(segment)
+                    if zone is not None:
+                        zones[num] = zone
+                num += 1
+            manager.replace_folder_map(target, index)
+            if self._zone_map is not None:
+                self._zone_map.replace(target, zones)
+            replaced.extend(manager.file_path(folder, file) for folder, file, _, _ in files)
+            emptied.extend(group[1:])
+            written += len(segments)
+
+        if emptied:
+            manager.replace_db_map(db_index)
+        manager.rebuild_snapshot()
+        for filepath in replaced:
+            try:
+                os.remove(filepath)
+            except FileNotFoundError:
+                pass
+        for folder in emptied:
+            shutil.rmtree(f"{manager.filepath}/{folder}", ignore_errors=True)
+            manager.folder_indexes.pop(folder, None)
+            if self._zone_map is not None:
+                self._zone_map.folders.pop(folder, None)
+        manager.folder_sizes.clear()
+        if manager.cache is not None:
+            manager.cache.clear()
+        if replaced:
+            # readers drop everything they loaded before the compaction on their next refresh
+            manager.generation += 1
+            self.publish()
+        return len(replaced) - written
+
+    def plan_segments(self, files: list, segment_bytes: int) -> list:
+        """
+        plan_segments: (int * int * int * int) list * int -> (int * int * int * int) list list
+        splits sealed files, given as (folder, file, start, end), into runs whose entries
+        fit in segment_bytes bytes. Runs of delta encoded files also have to span at most
+        MAX_DELTA seconds.
+        """
+        manager = self._file_manager
+        lines = max(1, segment_bytes // self._packer.line_size)
+        segments = []
+        segment = []
+        count = 0
+        for entry in files:
+            folder, file, start, end = entry
+            size = manager.data_size(manager.file_path(folder, file)) // self._packer.line_size
+            if segment and (count + size > lines or (self._delta and end - segment[0][2] > MAX_DELTA)):
+                segments.append(segment)
+                segment = []
+                count = 0
+            segment.append(entry)
+            count += size
+        if segment:
+            segments.append(segment)
+        return segments
+
+    def write_segment(self, filepath: str, segment: list) -> None:
+        """
+        write_segment: str * (int * int * int * int) list -> None
+        writes the entries of a run of sealed files to one segment file
+        """
+        manager = self._file_manager
+        base = segment[0][2]
+        data = bytearray()
+        for folder, file, start, _ in segment:
+            contents = manager.read_data(manager.file_path(folder, file))
+            if self._delta and start != base:
+                # delta encoded timestamps are rebased onto the start of the segment
+                rows = self._packer.unpack_many(contents)
+                contents = self._packer.pack_many([(row[0] + start - base, *row[1:]) for row in rows])
+            data += contents
+        manager.write_data(filepath, bytes(data))
+
+    def merge_zones(self, segment: list):
+        """
+        returns the zone covering every file of a run, or None if one of them has no zone
+        """
+        zones = [self._zone_map.zones(folder).get(file) for folder, file, _, _ in segment]
+        if any(zone is None for zone in zones):
+            return None
+        return (tuple(map(min, zip(*(zone[0] for zone in zones)))),
+                tuple(map(max, zip(*(zone[1] for zone in zones)))))
+
+    def seal_zone(self):
+        """
+        records the zone of the current file in the zone map as it is sealed
+        """
+        try:
+            with open(self._file_manager.current_file, "rb") as fd:
+                rows = self._packer.unpack_many(fd.read(), self._zone_map.indexes)
+        except FileNotFoundError:
+            rows = []
+        columns = list(zip(*rows)) if rows else [()] * len(self._zone_map.indexes)
+        self._zone_map.seal(self._file_manager.folders, self._file_manager.files, columns)
 
     def nth(self, n):
+        self.flush()
         with open(self._file_manager.current_file, "rb") as fd:
             fd.seek(n*self._packer.line_size)
             line = fd.read(self._packer.line_size)
             return self._packer.unpack(line)[1:]
 
     def col(self, i):
-        data = []
+        self.flush()
         with open(self._file_manager.current_file, "rb") as fd:
-            fd.seek(0)
-            for _ in range(self._packer.line_size):
-                line = fd.read(self._packer.line_size)
-                if len(line) != self._packer.line_size:
-                    break
-                line = self._packer.unpack(line)
-                data.append(line[i])
+            data = [line[i] for line in self._packer.unpack_many(fd.read())]
+        if i == 0 and self._delta:
+            data = [t + self._file_manager.file_start_time for t in data]
         return data[self._cursor:] + data[:self._cursor]
 
-    def get_data_at_time(self, t: time.struct_time):
+    def field_indexes(self, fields: tuple) -> tuple:
+        """
+        field_indexes: str tuple -> int tuple
+        converts field names into their positions in the database entries. Returns None if
+        no fields are given, meaning every field.
+        """
+        if fields is None:
+            return None
+        if isinstance(fields, str):
+            fields = (fields,)
+        if len(fields) == 0:
+            raise ValueError("at least one field must be requested")
+        indexes = []
+        for field in fields:
+            if field not in self._field_names:
+                raise ValueError(f"unknown field: {field}")
+            indexes.append(self._field_names.index(field))
+        return tuple(indexes)
+
+    def get_data_at_time(self, t: time.struct_time, fields: tuple = None):
         """
         struct_time -> tuple
         Given a time struct that was used to log in the database, this will return the first entry
-        logged at that time.
+        logged at that time. If field names are given, only those fields are decoded and returned,
+        in the order given.
 
         The precision of this function goes only to the nearest second because of the restrictions
         of struct_time
         """
-        tfloat = time.mktime(t)
-        filepath = self._file_manager.location_from_time(tfloat)
+        indexes = self.field_indexes(fields)
+        self.flush()
+        tfloat = self.to_timestamp(t)
+        folder, file = self._file_manager.file_from_time(tfloat)
         if tfloat < self._init_time:
             raise ValueError("time is before database init time")
+        started = self.query_started()
         try:
-            with open(filepath, "rb") as fd:
-                for _ in range(self._file_manager.lines_per_file):
-                    raw_data = fd.read(self._packer.line_size)
-                    data = self._packer.unpack(raw_data)
-                    if (data[0] == tfloat):
-                        return data
+            base = self.file_base(folder, file)
+            with self._file_manager.open_data(self._file_manager.file_path(folder, file)) as fd:
+                line_size = self._packer.line_size
+                lines = fd.seek(0, os.SEEK_END) // line_size
+                line = self.search_file(fd, lines, tfloat - base)
+                if line < self.search_file(fd, lines, tfloat - base, after=True):
+                    fd.seek(line * line_size)
+                    data = self._packer.unpack(fd.read(line_size), indexes)
+                    self.read_bytes(line_size)
+                    return restore_times([data], base, indexes)[0] if base else data
         except Exception as e:
-            print(f"could not find data: {e}")
+            self._file_manager.report("could not find data", e)
+        finally:
+            self.query_finished("point_query", started)
         return None
 
-    def get_data_at_range(self, start_time: time.struct_time, end_time: time.struct_time):
+    def search_file(self, fd, lines: int, t: float, after: bool = False) -> int:
+        """
+        search_file: file * int * float * bool -> int
+        Binary searches the first `lines` lines of an open data file for the first line
+        with a timestamp at or after t, or strictly after t if `after` is True. Only the
+        timestamp of each probed line is read. Returns `lines` if there is no such line.
+        """
+        return FileManager.search_file(fd, lines, self._packer.line_size, self._packer.field_structs[0],
+                                       self._packer.field_offsets[0], t, after)
+
+    def get_data_at_range(self, start_time: time.struct_time, end_time: time.struct_time, fields: tuple = None,
+                          workers: int = None, executor=None, explain: bool = False):
         """
         (struct_time * struct_time) -> tuple
         Given a range of time, first argument of start time, second argument of end time
-        this function will return all database entries falling within that range
+        this function will return all database entries falling within that range. If field
+        names are given, only those fields are decoded and returned, in the order given.
+
+        If workers or executor are given, files are read and decoded in parallel. executor is
+        either an existing concurrent.futures.Executor or "thread" or "process" to create a pool
+        of that kind with `workers` workers for this query. Entries are still returned in order.
+
+        If explain is True, (entries, plan) is returned instead, see explain. Explained queries
+        are always read serially.
 
         the struct_time datatype only holds precision of the nearest second, so this
         database only has precision to the nearest second as well.
         """
-        start = time.mktime(start_time)
-        end = time.mktime(end_time)
-        filepaths = self._file_manager.locations_from_range(start, end)
+        if explain:
+            return self.explain(start_time, end_time, fields=fields)
+        if workers is not None or executor is not None:
+            return self.get_data_at_range_parallel(start_time, end_time, fields, workers, executor)
         entries = []
-        for filepath in filepaths:
+        for chunk in self.iter_chunks(start_time, end_time, fields=fields):
+            entries.extend(chunk)
+        return entries
+
+    def get_data_at_range_parallel(self, start_time: time.struct_time, end_time: time.struct_time,
+                                   fields: tuple = None, workers: int = None, executor=None) -> list:
+        """
+        (struct_time * struct_time * str tuple * int * Executor) -> tuple list
+        get_data_at_range, with the files in range read by the workers of an executor
+        """
+        indexes = self.field_indexes(fields)
+        if executor is None:
+            executor = "thread"
+        if not isinstance(executor, Executor):
+            if executor not in ("thread", "process"):
+                raise ValueError(f"unknown executor: {executor}")
+            pool = ThreadPoolExecutor if executor == "thread" else ProcessPoolExecutor
+            with pool(max_workers=workers) as owned:
+                return self.get_data_at_range_parallel(start_time, end_time, fields, workers, owned)
+
+        self.flush()
+        started = self.query_started()
+        start = self.to_timestamp(start_time)
+        end = self.to_timestamp(end_time)
+        files = self._file_manager.files_from_range(start, end)
+        # a reader only reads the committed entries of the current file, which workers cannot tell
+        current = []
+        if self._readonly and files and files[-1] == (self._file_manager.folders, self._file_manager.files):
+            folder, file = files.pop()
+            current = self.scan_file(self._file_manager.file_path(folder, file), start, end, indexes=indexes,
+                                     base=self.file_base(folder, file))
+        filepaths = [self._file_manager.file_path(folder, file) for folder, file in files]
+        bases = [self.file_base(folder, file) for folder, file in files]
+        compressions = [self._file_manager.compression_of(filepath) for filepath in filepaths]
+        count = len(filepaths)
+        # hand files to process workers in batches to limit pickling overhead
+        chunksize = max(1, count // (4 * (workers or os.cpu_count() or 1)))
+        results = executor.map(read_entries, filepaths, [self._packer.user_fstring] * count,
+                               [start] * count, [end] * count, [indexes] * count, bases, compressions,
+                               chunksize=chunksize)
+        entries = []
+        for filepath, result in zip(filepaths, results):
+            if isinstance(result, Exception):
+                self._file_manager.report(f"could not search file {filepath}", result)
+                continue
+            entries.extend(result)
+        for chunk in current:
+            entries.extend(chunk)
+        if started is not None:
+            # workers open files themselves, so the files in range are counted as read whole
+            self._metrics.count("files_opened", count)
+            self.read_bytes(sum(os.path.getsize(filepath) for filepath in filepaths if os.path.exists(filepath)))
+        self.query_finished("parallel_range_query", started)
+        return entries
+
+    def get_rollup(self, start_time: time.struct_time, end_time: time.struct_time, bucket: int, field: str):
+        """
+        (struct_time * struct_time * int * str) -> tuple list
+        Returns (bucket start, count, sum, min, max) of a numeric field for every rollup bucket
+        of the given size that starts within a range of time, including the bucket that holds
+        start_time. The database must have been created with the bucket in rollup_buckets.
+        """
+        rollup = self._rollups.get(bucket)
+        if rollup is None:
+            raise ValueError(f"no rollup is kept for buckets of {bucket} seconds")
+        index = self.field_indexes((field,))[0]
+        if index not in rollup.indexes:
+            raise ValueError(f"{field} is not a numeric field")
+        self.flush()
+        return rollup.query(self.to_timestamp(start_time), self.to_timestamp(end_time), rollup.indexes.index(index))
+
+    def get_range_array(self, start_time: time.struct_time, end_time: time.struct_time):
+        """
+        (struct_time * struct_time) -> numpy.ndarray
+        Returns the database entries falling within a range of time as a NumPy structured
+        array with one field per database field, named after the field names. Files are
+        loaded straight into arrays without decoding each entry. Requires numpy.
+        """
+        if np is None:
+            raise ImportError("get_range_array requires numpy")
+        self.flush()
+        start = self.to_timestamp(start_time)
+        end = self.to_timestamp(end_time)
+        dtype = np.dtype(self._packer.make_dtype(self._field_names))
+        timestamp = dtype.names[0]
+        # delta encoded timestamps are returned as absolute "i" timestamps
+        result_dtype = dtype
+        if self._delta:
+            result_dtype = np.dtype([(name, "i4" if name == timestamp else dtype.fields[name][0])
+                                     for name in dtype.names])
+        started = self.query_started()
+        arrays = []
+        for folder, file in self._file_manager.files_from_range(start, end):
             try:
-                with open(filepath, "rb") as file:
-                    for _ in range(self._file_manager.lines_per_file):
-                        raw_data = file.read(self._packer.line_size)
-                        data = self._packer.unpack(raw_data)
-                        if (start <= data[0] and data[0] <= end):
-                            entries.append(data)
+                with self._file_manager.open_data(self._file_manager.file_path(folder, file)) as fd:
+                    data = fd.read()
             except Exception as e:
-                print(f"could not search file: {e}")
+                self._file_manager.report("could not search file", e)
+                continue
+            self.read_bytes(len(data))
+            entries = np.frombuffer(data, dtype=dtype, count=len(data) // dtype.itemsize)
+            times = entries[timestamp]
+            if self._delta:
+                times = times.astype(np.int64) + self.file_base(folder, file)
+            low = np.searchsorted(times, start, side="left")
+            high = np.searchsorted(times, end, side="right")
+            entries = entries[low:high]
+            if self._delta:
+                restored = np.empty(len(entries), dtype=result_dtype)
+                for name in dtype.names:
+                    restored[name] = entries[name]
+                restored[timestamp] = times[low:high]
+                entries = restored
+            arrays.append(entries)
+        result = np.concatenate(arrays) if arrays else np.empty(0, dtype=result_dtype)
+        self.query_finished("array_query", started)
+        return result
+
+    def iter_range(self, start_time: time.struct_time, end_time: time.struct_time, chunk_size: int = 1024,
+                   fields: tuple = None):
+        """
+        (struct_time * struct_time * int * str tuple) -> tuple iterator
+        Lazily yields the database entries falling within a range of time, in the order
+        they were logged. At most chunk_size entries are read and decoded at once, so
+        memory use does not grow with the width of the range. fields are handled as in
+        get_data_at_range.
+        """
+        for chunk in self.iter_chunks(start_time, end_time, chunk_size, fields):
+            yield from chunk
+
+    def iter_chunks(self, start_time: time.struct_time, end_time: time.struct_time, chunk_size: int = 1024,
+                    fields: tuple = None):
+        """
+        (struct_time * struct_time * int * str tuple) -> tuple list iterator
+        Lazily yields lists of at most chunk_size database entries falling within a range
+        of time. The first and last entries in range are found by binary search in each file,
+        so reading starts at start_time and stops at the first entry after end_time.
+        """
+        if chunk_size <= 0:
+            raise ValueError("chunk_size must be positive")
+        indexes = self.field_indexes(fields)
+        self.flush()
+        started = self.query_started()
+        start = self.to_timestamp(start_time)
+        end = self.to_timestamp(end_time)
+        try:
+            for folder, file in self._file_manager.files_from_range(start, end):
+                past_end = yield from self.scan_file(self._file_manager.file_path(folder, file), start, end,
+                                                     chunk_size, indexes, self.file_base(folder, file))
+                if past_end:
+                    return
+        finally:
+            self.query_finished("range_query", started)
+
+    def scan_file(self, filepath: str, start: float, end: float, chunk_size: int = 1024, indexes: tuple = None,
+                  base: int = 0):
+        """
+        (str * float * float * int * int tuple * int) -> tuple list iterator
+        Lazily yields lists of at most chunk_size entries of one data file falling between
+        start and end. base is the time the timestamps of the file are relative to. Returns
+        True if the file holds entries after end.
+        """
+        line_size = self._packer.line_size
+        try:
+            with self._file_manager.open_data(filepath) as fd:
+                lines = fd.seek(0, os.SEEK_END) // line_size
+                line = self.search_file(fd, lines, start - base)
+                last = self.search_file(fd, lines, end - base, after=True)
+                fd.seek(line * line_size)
+                while line < last:
+                    count = min(chunk_size, last - line)
+                    rows = self._packer.unpack_many(fd.read(count * line_size), indexes)
+                    self.read_bytes(count * line_size)
+                    yield restore_times(rows, base, indexes) if base else rows
+                    line += count
+                return last < lines
+        except Exception as e:
+            self._file_manager.report("could not search file", e)
+        return False
 
+    def compile_where(self, where) -> tuple:
+        """
+        compile_where: condition list -> (int * str * any) list * (int * function * any) list
+        returns the conditions of a query with field names replaced by field indexes, for
+        zone maps, and as (index, comparison function, value) tests to run on entries
+        """
+        if len(where) > 0 and isinstance(where[0], str):
+            where = (where,)
+        conditions = []
+        for field, op, value in where:
+            if op not in OPERATORS:
+                raise ValueError(f"unsupported operator: {op}")
+            conditions.append((self.field_indexes((field,))[0], op, value))
+        functions = {"<": operator.lt, "<=": operator.le, ">": operator.gt,
+                     ">=": operator.ge, "==": operator.eq, "!=": operator.ne}
+        return conditions, [(index, functions[op], value) for index, op, value in conditions]
+
+    def query(self, start_time: time.struct_time, end_time: time.struct_time, where=(), fields: tuple = None,
+              explain: bool = False):
+        """
+        (struct_time * struct_time * condition list * str tuple * bool) -> tuple list
+        Returns the database entries within a range of time that match every condition in
+        where. A condition is a (field name, operator, value) tuple, where the operator is one
+        of <, <=, >, >=, == or !=. Files whose zone map rules out a condition are skipped
+        without being read. fields and explain are handled as in get_data_at_range.
+        """
+        if explain:
+            return self.explain(start_time, end_time, where, fields)
+        conditions, tests = self.compile_where(where)
+        indexes = self.field_indexes(fields)
+        project = DensePacker.make_permutation(list(indexes)) if indexes is not None else tuple
+
+        self.flush()
+        started = self.query_started()
+        start = self.to_timestamp(start_time)
+        end = self.to_timestamp(end_time)
+        entries = []
+        for folder, file in self._file_manager.files_from_range(start, end):
+            if self._zone_map is not None and not self._zone_map.may_match(folder, file, conditions):
+                if self._metrics is not None:
+                    self._metrics.count("files_skipped")
+                continue
+            for chunk in self.scan_file(self._file_manager.file_path(folder, file), start, end,
+                                        base=self.file_base(folder, file)):
+                entries.extend(project(data) for data in chunk
+                               if all(test(data[index], value) for index, test, value in tests))
+        self.query_finished("filtered_query", started)
         return entries
+
+    def explain(self, start_time: time.struct_time, end_time: time.struct_time, where=(), fields: tuple = None):
+        """
+        (struct_time * struct_time * condition list * str tuple) -> tuple list * dict
+        Runs query and returns its entries along with the plan it followed and what it cost:
+        the folders and files in the database, which of them were scanned and how many were
+        pruned by the maps or skipped by zone maps, the entries decoded and returned and the
+        bytes of entries read from each file, and the microseconds spent choosing files and
+        scanning them.
+        """
+        conditions, tests = self.compile_where(where)
+        indexes = self.field_indexes(fields)
+        project = DensePacker.make_permutation(list(indexes)) if indexes is not None else tuple
+        self.flush()
+        started = time.perf_counter()
+        start = self.to_timestamp(start_time)
+        end = self.to_timestamp(end_time)
+        manager = self._file_manager
+        folders = manager.folders_from_range(start, end)
+        files = manager.files_from_range(start, end)
+        # the current folder and file are not in the maps yet
+        folder_count = len(manager.db_index) + 1
+        file_count = sum(len(manager.folder_index(folder)) for folder in folders)
+        if manager.folders in folders:
+            file_count += 1
+        planned = time.perf_counter()
+
+        line_size = self._packer.line_size
+        entries = []
+        scanned = []
+        for folder, file in files:
+            filepath = manager.file_path(folder, file)
+            stats = {"folder": folder, "file": file, "path": filepath,
+                     "file_bytes": os.path.getsize(filepath) if os.path.exists(filepath) else 0,
+                     "skipped": False, "decoded": 0, "returned": 0, "bytes_read": 0}
+            scanned.append(stats)
+            if self._zone_map is not None and not self._zone_map.may_match(folder, file, conditions):
+                stats["skipped"] = True
+                continue
+            for chunk in self.scan_file(filepath, start, end, base=self.file_base(folder, file)):
+                matches = [project(data) for data in chunk
+                           if all(test(data[index], value) for index, test, value in tests)]
+                stats["decoded"] += len(chunk)
+                stats["returned"] += len(matches)
+                entries.extend(matches)
+                stats["bytes_read"] += len(chunk) * line_size
+        finished = time.perf_counter()
+
+        decoded = sum(stats["decoded"] for stats in scanned)
+        plan = {
+            "start": start,
+            "end": end,
+            "folders": folder_count,
+            "folders_scanned": folders,
+            "folders_pruned": folder_count - len(folders),
+            "files": file_count,
+            "files_scanned": scanned,
+            "files_pruned": file_count - len(files),
+            "files_skipped": sum(stats["skipped"] for stats in scanned),
+            "bytes_read": decoded * line_size,
+            "records_decoded": decoded,
+            "records_returned": len(entries),
+            "plan_us": (planned - started) * 1e6,
+            "scan_us": (finished - planned) * 1e6,
+            "total_us": (finished - started) * 1e6,
+        }
+        return entries, plan
@@ -0,0 +1,157 @@
+import os
+import struct
+from bisect import bisect_left
+from src.file_manager import FileManager, print_error
+
+NUMERIC_TYPES = "hifdQ"
+
+
+class Rollup:
+    """
+    Keeps the count of entries and the sum, minimum and maximum of every numeric
+    field over fixed size buckets of time. Finished buckets are appended to
+    {filepath}/rollups/{bucket}.rlp as a struct of bucket start, count and then
+    sum, min and max for each numeric field. The bucket being filled is saved
+    to {bucket}.state so that it can be continued when the database is reopened.
+    Buckets are a number of seconds wide, scale is the number of timestamp units
+    in a second. Errors are passed on to report, which prints them by default.
+    """
+
+    def __init__(self, bucket: int, fstring: str, filepath: str, new_db: bool = True, scale: int = 1,
+                 report=print_error) -> None:
+        if bucket <= 0:
+            raise ValueError("rollup bucket must be a positive number of seconds")
+        self.bucket = int(bucket)
+        self.report = report
+        self.width = self.bucket * scale
+        # the timestamp at index 0 is never rolled up
+        self.indexes = [i for i in range(1, len(fstring)) if fstring[i] in NUMERIC_TYPES]
+        self.struct = struct.Struct("qq" + "ddd" * len(self.indexes))
+        self.path = f"{filepath}/rollups/{self.bucket}.rlp"
+        self.state_path = f"{filepath}/rollups/{self.bucket}.state"
+        self.reset(None)
+        if new_db:
+            open(self.path, "xb").close()
+        else:
+            self.load_state()
+
+    @staticmethod
+    def find_buckets(filepath: str) -> list:
+        """
+        find_buckets: str -> int list
+        returns the bucket sizes of the rollups kept by the database at filepath
+        """
+        try:
+            names = os.listdir(f"{filepath}/rollups")
+        except FileNotFoundError:
+            return []
+        return sorted(int(name[:-4]) for name in names if name.endswith(".rlp"))
+
+    def reset(self, start) -> None:
+        self.start = start
+        self.count = 0
+        self.sums = [0] * len(self.indexes)
+        self.mins = [float("inf")] * len(self.indexes)
+        self.maxs = [float("-inf")] * len(self.indexes)
+
+    def values(self) -> tuple:
+        values = [self.start, self.count]
+        for i in range(len(self.indexes)):
+            values += [self.sums[i], self.mins[i], self.maxs[i]]
+        return tuple(values)
+
+    def load_state(self) -> None:
+        try:
+            with open(self.state_path, "rb") as fd:
+                values = self.struct.unpack(fd.read())
+            with open(self.path, "rb") as fd:
+                if fd.seek(0, os.SEEK_END) >= self.struct.size:
+                    fd.seek(-self.struct.size, os.SEEK_END)
+                    # the saved bucket was already finished and written
+                    if self.struct.unpack(fd.read(self.struct.size))[0] >= values[0]:
+                        return
+        except Exception:
+            return
+        self.start, self.count = values[0], values[1]
+        self.sums = list(values[2::3])
+        self.mins = list(values[3::3])
+        self.maxs = list(values[4::3])
+
+    def save_state(self) -> None:
+        """
+        saves the bucket being filled so it survives the database being reopened
+        """
+        if self.count == 0:
+            return
+        try:
+            with open(self.state_path, "wb") as fd:
+                fd.write(self.struct.pack(*self.values()))
+        except Exception as e:
+            self.report("could not save rollup state", e)
+
+    def write_bucket(self) -> None:
+        """
+        appends the bucket being filled to the rollup file
+        """
+        if self.count == 0:
+            return
+        try:
+            with open(self.path, "ab") as fd:
+                fd.write(self.struct.pack(*self.values()))
+        except Exception as e:
+            self.report("could not write rollup", e)
+
+    def add(self, start: int, rows) -> None:
+        """
+        add: int * tuple list -> None
+        adds entries that all fall in the bucket starting at start
+        """
+        if start != self.start:
+            self.write_bucket()
+            self.reset(start)
+        self.count += len(rows)
+        for i, index in enumerate(self.indexes):
+            column = [row[index] for row in rows]
+            self.sums[i] += sum(column)
+            self.mins[i] = min(self.mins[i], min(column))
+            self.maxs[i] = max(self.maxs[i], max(column))
+
+    def update(self, timestamp: int, row: tuple) -> None:
+        self.add(timestamp - timestamp % self.width, (row,))
+
+    def update_many(self, timestamps: list, rows: list) -> None:
+        """
+        update_many: int list * tuple list -> None
+        adds entries with sorted timestamps, one bucket at a time
+        """
+        i = 0
+        while i < len(rows):
+            start = timestamps[i] - timestamps[i] % self.width
+            end = bisect_left(timestamps, start + self.width, i)
+            self.add(start, rows[i:end])
+            i = end
+
+    def query(self, start: float, end: float, column: int) -> list:
+        """
+        query: float * float * int -> tuple list
+        returns (bucket start, count, sum, min, max) of the numeric field at column
+        for every bucket starting between the bucket holding start and end
+        """
+        first = start - start % self.width
+        size = self.struct.size
+        codec = struct.Struct("q")
+        values = []
+        try:
+            with open(self.path, "rb") as fd:
+                buckets = fd.seek(0, os.SEEK_END) // size
+                low = FileManager.search_file(fd, buckets, size, codec, 0, first)
+                high = FileManager.search_file(fd, buckets, size, codec, 0, end, after=True)
+                fd.seek(low * size)
+                data = fd.read((high - low) * size)
+            values = list(self.struct.iter_unpack(data))
+        except Exception as e:
+            self.report("could not read rollup", e)
+        if self.count and first <= self.start <= end:
+            values.append(self.values())
+        offset = 2 + 3 * column
+        return [(entry[0], entry[1], *entry[offset:offset + 3]) for entry in values]
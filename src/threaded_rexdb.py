@@ -0,0 +1,214 @@
+import queue
+import threading
+import time
+from src.rexdb import RexDB
+
+# what log does when the queue is full
+FULL_POLICIES = ("block", "drop", "error")
+
+
+class ThreadedRexDB:
+    """
+    Thread safe front end for a RexDB with many producer threads. Logged rows are stamped
+    when log is called and put on a bounded queue, and a single writer thread drains it,
+    writing everything queued so far with one log_many call, so rows are packed together
+    and written with one write per file. Rows are stamped and queued under one lock, so
+    the queue is always in time order.
+
+    When the queue is full, log waits for room with the "block" policy, optionally for at
+    most timeout seconds, returns False with the "drop" policy and raises queue.Full with
+    the "error" policy. Rows that were not queued are counted in dropped.
+
+    Rows are packed once before they are queued, so a malformed row raises ValueError in
+    the producer that logged it instead of failing the batch it would have been written in.
+    """
+
+    def __init__(self, db: RexDB, max_queued: int = 1024, batch_size: int = 1024, full: str = "block",
+                 timeout: float = None, sync: bool = False) -> None:
+        if full not in FULL_POLICIES:
+            raise ValueError(f"unknown queue full policy: {full}")
+        if max_queued <= 0 or batch_size <= 0:
+            raise ValueError("max_queued and batch_size must be positive")
+        self.db = db
+        self.batch_size = batch_size
+        self.full = full
+        self.timeout = timeout
+        # fsync the current file after every batch
+        self.sync = sync
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+        self._queue = queue.Queue(max_queued)
+        # held by producers while stamping and queueing rows
+        self._order = threading.Lock()
+        # held by the writer thread and by queries while they use the database
+        self._db_lock = threading.Lock()
+        self._last = db.last_timestamp()
+        self._closed = False
+        self._writer = threading.Thread(target=self.write, name="rexdb-writer", daemon=True)
+        self._writer.start()
+
+    @classmethod
+    def open(cls, *args, max_queued: int = 1024, batch_size: int = 1024, full: str = "block",
+             timeout: float = None, sync: bool = False, **kwargs):
+        """
+        creates or reopens a RexDB, taking the same arguments as RexDB
+        """
+        return cls(RexDB(*args, **kwargs), max_queued, batch_size, full, timeout, sync)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def run(self, function, *args):
+        """
+        runs function(*args) while no batch is being written
+        """
+        with self._db_lock:
+            return function(*args)
+
+    def log(self, data: tuple) -> bool:
+        """
+        log: tuple -> bool
+        queues an entry stamped with the time of the call. Returns True once it is queued,
+        or False if the queue was full and the entry was dropped. Raises ValueError if the
+        entry does not match the format of the database.
+        """
+        self.db.check_row(data)
+        with self._order:
+            # a clock stepping back between two threads is not an error for the caller
+            return self.put([data], [max(self.db.now(), self._last)])
+
+    def log_many(self, rows, timestamps=None) -> bool:
+        """
+        log_many: tuple list * struct_time list -> bool
+        queues a batch of entries as one item. If timestamps are not given, every entry is
+        stamped with the time of the call. Raises ValueError if the timestamps go back in
+        time, also relative to entries queued before, or if an entry does not match the
+        format of the database.
+        """
+        rows = list(rows)
+        if not rows:
+            return True
+        for row in rows:
+            self.db.check_row(row)
+        with self._order:
+            if timestamps is None:
+                stamps = [max(self.db.now(), self._last)] * len(rows)
+            else:
+                stamps = [int(self.db.to_timestamp(t)) for t in timestamps]
+                if len(stamps) != len(rows):
+                    raise ValueError("number of timestamps does not match number of rows")
+                if stamps[0] < self._last or stamps != sorted(stamps):
+                    raise ValueError("logging backwards in time")
+            return self.put(rows, stamps)
+
+    def put(self, rows: list, stamps: list) -> bool:
+        """
+        puts rows on the queue following the full policy, must be called holding the order lock
+        """
+        if self._closed:
+            raise RuntimeError("database was closed")
+        try:
+            if self.full == "block":
+                self._queue.put((rows, stamps), timeout=self.timeout)
+            else:
+                self._queue.put_nowait((rows, stamps))
+        except queue.Full:
+            self.dropped += len(rows)
+            if self.full == "error":
+                raise
+            return False
+        self._last = stamps[-1]
+        return True
+
+    def write(self):
+        """
+        the writer thread, writes queued entries in batches of up to batch_size entries
+        """
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            items = [item]
+            count = len(item[0])
+            stop = False
+            while count < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                items.append(item)
+                count += len(item[0])
+            self.write_items(items)
+            for _ in range(len(items) + stop):
+                self._queue.task_done()
+            if stop:
+                return
+
+    def write_items(self, items: list) -> None:
+        rows = [row for item in items for row in item[0]]
+        stamps = [stamp for item in items for stamp in item[1]]
+        try:
+            with self._db_lock:
+                success = self.db.log_many(rows, stamps)
+                if self.sync:
+                    success = self.db.sync() and success
+        except Exception as e:
+            if len(items) > 1:
+                # log_many checks its input before writing anything, so the items of the
+                # batch can be retried one at a time to fail only the ones at fault
+                for item in items:
+                    self.write_items([item])
+                return
+            print(f"could not write batch: {e}")
+            success = False
+        self.batches += 1
+        if success:
+            self.written += len(rows)
+        else:
+            self.failed += len(rows)
+
+    def wait(self, timeout: float = None) -> bool:
+        """
+        wait: float -> bool
+        waits until every entry queued so far has been written, for at most timeout seconds.
+        Returns False if the timeout passed first.
+        """
+        with self._queue.all_tasks_done:
+            return self._queue.all_tasks_done.wait_for(lambda: not self._queue.unfinished_tasks, timeout)
+
+    def get_data_at_time(self, t: time.struct_time, fields: tuple = None):
+        return self.run(self.db.get_data_at_time, t, fields)
+
+    def get_data_at_range(self, start_time: time.struct_time, end_time: time.struct_time,
+                          fields: tuple = None):
+        return self.run(self.db.get_data_at_range, start_time, end_time, fields)
+
+    def query(self, start_time: time.struct_time, end_time: time.struct_time, where=(), fields: tuple = None):
+        return self.run(self.db.query, start_time, end_time, where, fields)
+
+    def flush(self) -> bool:
+        """
+        waits for every queued entry to be written, then flushes the database
+        """
+        self.wait()
+        return self.run(self.db.flush)
+
+    def close(self) -> bool:
+        """
+        waits for the writer thread to write every queued entry, then closes the database
+        """
+        with self._order:
+            if not self._closed:
+                self._closed = True
+                self._queue.put(None)
+        self._writer.join()
+        return self.run(self.db.close)
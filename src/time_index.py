@@ -0,0 +1,95 @@
+from array import array
+from bisect import bisect_left, bisect_right
+
+
+class TimeIndex:
+    """
+    In memory copy of a map file. Each entry is a start time, an end time and
+    the number of the folder or file the entry describes. Entries are stored in
+    parallel arrays in the order they were written, which is also sorted by
+    both start and end time, so lookups are binary searches.
+
+    Map entries are three ints, or three long longs ("q") for databases with
+    nanosecond timestamps.
+    """
+
+    def __init__(self, typecode: str = "i") -> None:
+        self.typecode = typecode
+        self.starts = array(typecode)
+        self.ends = array(typecode)
+        self.nums = array(typecode)
+
+    @property
+    def entry_size(self) -> int:
+        return 3 * self.starts.itemsize
+
+    @classmethod
+    def from_bytes(cls, data: bytes, typecode: str = "i"):
+        """
+        from_bytes: bytes -> TimeIndex
+        builds an index from the contents of a map file, a sequence of
+        (start time, end time, number) structs. A trailing partial
+        entry is ignored.
+        """
+        index = cls(typecode)
+        entries = array(typecode)
+        entries.frombytes(data[:len(data) - (len(data) % index.entry_size)])
+        index.starts = entries[0::3]
+        index.ends = entries[1::3]
+        index.nums = entries[2::3]
+        return index
+
+    @classmethod
+    def from_file(cls, path: str, typecode: str = "i"):
+        """
+        from_file: str -> TimeIndex
+        reads a map file into an index
+        """
+        with open(path, "rb") as fd:
+            return cls.from_bytes(fd.read(), typecode)
+
+    def __len__(self) -> int:
+        return len(self.nums)
+
+    def append(self, start: int, end: int, num: int) -> None:
+        self.starts.append(start)
+        self.ends.append(end)
+        self.nums.append(num)
+
+    def truncate(self, num: int) -> None:
+        """
+        truncate: int -> None
+        drops every entry numbered num or higher
+        """
+        i = bisect_left(self.nums, num)
+        del self.starts[i:], self.ends[i:], self.nums[i:]
+
+    def find(self, t: float):
+        """
+        find: float -> int
+        returns the number of the first entry with start <= t < end, or None
+        if no entry contains t
+        """
+        i = bisect_right(self.ends, t)
+        if i < len(self.nums) and self.starts[i] <= t:
+            return self.nums[i]
+        return None
+
+    def start_of(self, num: int):
+        """
+        start_of: int -> int
+        returns the start time of the entry numbered num, or None if there is no such entry
+        """
+        i = bisect_left(self.nums, num)
+        if i < len(self.nums) and self.nums[i] == num:
+            return self.starts[i]
+        return None
+
+    def overlapping(self, start: float, end: float) -> list:
+        """
+        overlapping: float * float -> int list
+        returns the numbers of every entry that overlaps [start, end], in order
+        """
+        low = bisect_left(self.ends, start)
+        high = bisect_right(self.starts, end)
+        return self.nums[low:high].tolist()
@@ -0,0 +1,118 @@
+import os
+import struct
+from src.file_manager import FileManager, print_error
+from src.rollup import NUMERIC_TYPES
+
+OPERATORS = ("<", "<=", ">", ">=", "==", "!=")
+
+
+class ZoneMap:
+    """
+    Keeps the minimum and maximum of every numeric field for each sealed file.
+    Each folder has a .zone file next to its map where an entry of file number
+    followed by the minimum and maximum of each field is appended whenever a
+    file is sealed. Queries use the zones to skip files that cannot hold any
+    entry matching their conditions.
+    """
+
+    def __init__(self, fstring: str, filepath: str, report=print_error) -> None:
+        self.filepath = filepath
+        # errors are passed on to report, which prints them by default
+        self.report = report
+        # the timestamp at index 0 is already covered by the maps
+        self.indexes = tuple(i for i in range(1, len(fstring)) if fstring[i] in NUMERIC_TYPES)
+        self.struct = struct.Struct("q" + "dd" * len(self.indexes))
+        self.folders = {}
+
+    @staticmethod
+    def exists(filepath: str, folder: int) -> bool:
+        return os.path.exists(f"{filepath}/{folder}/.zone")
+
+    def path(self, folder: int) -> str:
+        return f"{self.filepath}/{folder}/.zone"
+
+    def create(self, folder: int) -> None:
+        try:
+            open(self.path(folder), "wb").close()
+        except Exception as e:
+            self.report("Failed to create zone map", e)
+        self.folders[folder] = {}
+
+    def zones(self, folder: int) -> dict:
+        """
+        zones: int -> dict
+        returns the zones of a folder by file number, reading the .zone file the
+        first time the folder is used
+        """
+        zones = self.folders.get(folder)
+        if zones is None:
+            zones = {}
+            try:
+                with open(self.path(folder), "rb") as fd:
+                    data = fd.read()
+                for values in self.struct.iter_unpack(data[:len(data) - len(data) % self.struct.size]):
+                    zones[values[0]] = (values[1::2], values[2::2])
+            except Exception as e:
+                self.report(f"couldn't access zone map for {folder}", e)
+            self.folders[folder] = zones
+        return zones
+
+    def seal(self, folder: int, file: int, columns: list) -> None:
+        """
+        seal: int * int * tuple list -> None
+        records the minimum and maximum of each numeric field of a sealed file,
+        given its values as one tuple per numeric field
+        """
+        mins = tuple(min(column, default=float("inf")) for column in columns)
+        maxs = tuple(max(column, default=float("-inf")) for column in columns)
+        self.zones(folder)[file] = (mins, maxs)
+        values = [file]
+        for low, high in zip(mins, maxs):
+            values += [low, high]
+        try:
+            with open(self.path(folder), "ab") as fd:
+                fd.write(self.struct.pack(*values))
+        except Exception as e:
+            self.report("could not write to zone map", e)
+
+    def replace(self, folder: int, zones: dict) -> None:
+        """
+        replace: int * dict -> None
+        replaces the zones of a folder with zones, given by file number
+        """
+        data = bytearray()
+        for file, (mins, maxs) in zones.items():
+            values = [file]
+            for low, high in zip(mins, maxs):
+                values += [low, high]
+            data += self.struct.pack(*values)
+        FileManager.replace_file(self.path(folder), bytes(data))
+        self.folders[folder] = zones
+
+    def may_match(self, folder: int, file: int, conditions: list) -> bool:
+        """
+        may_match: int * int * (int * str * any) list -> bool
+        returns False if the zone of a file rules out one of the conditions, which
+        are given as (field index, operator, value). Files without a zone may match.
+        """
+        zone = self.zones(folder).get(file)
+        if zone is None:
+            return True
+        for index, operator, value in conditions:
+            if index not in self.indexes:
+                continue
+            position = self.indexes.index(index)
+            low, high = zone[0][position], zone[1][position]
+            if operator == "<" and not low < value:
+                return False
+            if operator == "<=" and not low <= value:
+                return False
+            if operator == ">" and not high > value:
+                return False
+            if operator == ">=" and not high >= value:
+                return False
+            if operator == "==" and not low <= value <= high:
+                return False
+            if operator == "!=" and low == high == value:
+                return False
+        return True
@@ -0,0 +1,22 @@
+from src.rexdb import RexDB
+
+
+def make_db(clock, filepath="sd", **kwargs):
+    """
+    creates a database of an integer and a float per entry, spread over many small files
+    and folders, on the time of clock
+    """
+    return RexDB('if', ("integer", "float"), bytes_per_file=100, files_per_folder=3,
+                 time_method=clock.gmtime, filepath=filepath, **kwargs)
+
+
+def fill(db, clock, times, rows):
+    """
+    logs rows entries (i, i / 2) a second apart, numbered on from the entries already in
+    times, and appends the time of each to times
+    """
+    for i in range(len(times), len(times) + rows):
+        times.append(clock.gmtime())
+        db.log((i, i / 2))
+        clock.sleep(1)
+    return times
@@ -0,0 +1,89 @@
+from pyfakefs import fake_filesystem_unittest
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from tests.faketime import FakeTime
+
+from src.async_rexdb import AsyncRexDB
+from src.rexdb import RexDB
+
+
+class AsyncRexDBTest(fake_filesystem_unittest.TestCase):
+    def setUp(self):
+        self.setUpPyfakefs()
+        self.time = FakeTime()
+        os.mkdir("sd")
+
+    def test_concurrent_producers(self):
+        async def produce(db, sensor):
+            for i in range(50):
+                await db.log((sensor, i))
+                await asyncio.sleep(0)
+
+        async def scenario():
+            async with await AsyncRexDB.open('ii', ("sensor", "index"), bytes_per_file=100, files_per_folder=3,
+                                             time_method=self.time.gmtime, filepath="sd") as db:
+                start = self.time.gmtime()
+                await asyncio.gather(*(produce(db, sensor) for sensor in range(10)))
+                self.assertTrue(await db.log_many([(99, i) for i in range(20)]))
+                end = self.time.gmtime()
+
+                rows = await db.get_data_at_range(start, end)
+                streamed = [row async for row in db.iter_range(start, end, chunk_size=7)]
+                return rows, streamed
+
+        rows, streamed = asyncio.run(scenario())
+        self.assertEqual(len(rows), 520)
+        self.assertEqual(streamed, rows)
+        for sensor in range(10):
+            self.assertEqual([row[2] for row in rows if row[1] == sensor], list(range(50)))
+
+    def test_batches_writes(self):
+        db = RexDB('i', ("int",), time_method=self.time.gmtime, filepath="sd")
+        calls = []
+        log_many = db.log_many
+
+        def counting_log_many(rows, timestamps=None):
+            calls.append(len(rows))
+            return log_many(rows, timestamps)
+
+        db.log_many = counting_log_many
+
+        async def scenario():
+            async_db = AsyncRexDB(db)
+            results = await asyncio.gather(*(async_db.log((i,)) for i in range(100)))
+            await async_db.close()
+            return results
+
+        self.assertEqual(asyncio.run(scenario()), [True] * 100)
+        self.assertEqual(sum(calls), 100)
+        self.assertLess(len(calls), 100)
+
+    def test_errors_fail_only_their_call(self):
+        db = RexDB('i', ("int",), time_method=self.time.gmtime, filepath="sd")
+
+        async def scenario():
+            async with AsyncRexDB(db) as async_db:
+                past = time.localtime(self.time.time() - 1000)
+                return await asyncio.gather(async_db.log((1,)), async_db.log_many([(2,)], [past]),
+                                            async_db.log((3,)), return_exceptions=True)
+
+        results = asyncio.run(scenario())
+        self.assertEqual(results[0], True)
+        self.assertIsInstance(results[1], ValueError)
+        self.assertEqual(results[2], True)
+
+    def test_shared_executor_is_not_shut_down(self):
+        db = RexDB('i', ("int",), time_method=self.time.gmtime, filepath="sd")
+        executor = ThreadPoolExecutor(max_workers=1)
+
+        async def scenario():
+            async_db = AsyncRexDB(db, executor=executor)
+            self.assertTrue(await async_db.log((1,)))
+            await async_db.close()
+
+        asyncio.run(scenario())
+        # the caller's executor still takes work
+        self.assertEqual(executor.submit(sum, [1, 2]).result(), 3)
+        executor.shutdown()
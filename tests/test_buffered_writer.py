@@ -0,0 +1,71 @@
+from pyfakefs import fake_filesystem_unittest
+import os
+from tests.faketime import FakeTime
+
+from src.rexdb import RexDB
+
+
+class BufferedWriterTest(fake_filesystem_unittest.TestCase):
+    def setUp(self):
+        self.setUpPyfakefs()
+        self.time = FakeTime()
+
+    def test_buffer_holds_data(self):
+        os.mkdir("sd")
+        db = RexDB('i', ("int",), bytes_per_file=1000, time_method=self.time.gmtime,
+                   filepath="sd", buffer_size=64)
+        db.log((1,))
+        db.log((2,))
+        self.assertFalse(os.path.exists(db._file_manager.current_file))
+
+        self.assertTrue(db.flush())
+        self.assertEqual(os.path.getsize(db._file_manager.current_file), 2 * db._packer.line_size)
+        db.close()
+
+    def test_size_threshold(self):
+        os.mkdir("sd")
+        db = RexDB('i', ("int",), bytes_per_file=1000, time_method=self.time.gmtime,
+                   filepath="sd", buffer_size=16)
+        # each line is 8 bytes, so the buffer is written every 2 lines
+        for i in range(5):
+            db.log((i,))
+        self.assertEqual(os.path.getsize(db._file_manager.current_file), 32)
+        db.close()
+        self.assertEqual(os.path.getsize(db._file_manager.current_file), 40)
+
+    def test_age_threshold(self):
+        os.mkdir("sd")
+        db = RexDB('i', ("int",), bytes_per_file=1000, time_method=self.time.gmtime,
+                   filepath="sd", buffer_size=1024, flush_interval=0)
+        db.log((1,))
+        self.assertEqual(os.path.getsize(db._file_manager.current_file), 8)
+        db.close()
+
+    def test_rollover_and_queries(self):
+        os.mkdir("sd")
+        times = []
+        with RexDB('if', ("integer", "float"), 20, 2, time_method=self.time.gmtime,
+                   filepath="sd", buffer_size=4096) as db:
+            for i in range(20):
+                times.append(self.time.gmtime())
+                db.log((i, 0.5))
+                self.time.sleep(1)
+            # sealed files are written out on rollover
+            self.assertEqual(os.path.getsize("sd/1/00001.db"), 2 * db._packer.line_size)
+            # queries see buffered entries
+            for i in range(20):
+                self.assertEqual(db.get_data_at_time(times[i])[1], i)
+            self.assertEqual(len(db.get_data_at_range(times[0], times[19])), 20)
+
+    def test_context_manager_flushes(self):
+        os.mkdir("sd")
+        times = []
+        with RexDB('i', ("int",), time_method=self.time.gmtime, filepath="sd", buffer_size=4096) as db:
+            for i in range(10):
+                times.append(self.time.gmtime())
+                db.log((i,))
+                self.time.sleep(1)
+
+        db = RexDB(filepath="sd", time_method=self.time.gmtime, new_db=False)
+        for i in range(10):
+            self.assertEqual(db.get_data_at_time(times[i])[1], i)
@@ -0,0 +1,69 @@
+from pyfakefs import fake_filesystem_unittest
+import os
+import time
+from tests.faketime import FakeTime
+from tests.sample_db import fill, make_db
+
+from src.rexdb import RexDB
+
+
+def count_files(filepath):
+    return sum(len([name for name in names if name.endswith(".db")]) for _, _, names in os.walk(filepath))
+
+
+class CompactionTest(fake_filesystem_unittest.TestCase):
+    def setUp(self):
+        self.setUpPyfakefs()
+        self.time = FakeTime()
+        os.mkdir("sd")
+        self.times = []
+
+    def filled_db(self, **kwargs):
+        db = make_db(self.time, **kwargs)
+        fill(db, self.time, self.times, 400)
+        return db
+
+    def check_queries(self, db):
+        rows = len(self.times)
+        self.assertEqual(db.get_data_at_range(self.times[0], self.times[-1]),
+                         [(time.mktime(self.times[i]), i, i / 2) for i in range(rows)])
+        self.assertEqual(list(db.iter_range(self.times[17], self.times[301], chunk_size=7)),
+                         [(time.mktime(self.times[i]), i, i / 2) for i in range(17, 302)])
+        for i in (0, 8, 9, 150, rows - 1):
+            self.assertEqual(db.get_data_at_time(self.times[i]), (time.mktime(self.times[i]), i, i / 2))
+        self.assertEqual(db.query(self.times[0], self.times[-1], where=("integer", "<", 3), fields=("integer",)),
+                         [(0,), (1,), (2,)])
+
+    def test_segments(self):
+        db = self.filled_db(zone_maps=True)
+        files = count_files("sd")
+        removed = db.compact(segment_bytes=1000)
+        self.assertEqual(count_files("sd"), files - removed)
+        self.assertGreater(removed, 0)
+        self.check_queries(db)
+        self.assertEqual(db.compact(segment_bytes=1000), 0)
+
+    def test_folder_groups(self):
+        db = self.filled_db()
+        folders = len(db._file_manager.db_index)
+        db.compact(segment_bytes=1 << 20, folder_group=4)
+        self.assertEqual(len(db._file_manager.db_index), (folders + 3) // 4)
+        self.assertEqual(len([name for name in os.listdir("sd") if name.isdigit()]), (folders + 3) // 4 + 1)
+        self.check_queries(db)
+
+        # logging goes on, and the compacted database reopens
+        fill(db, self.time, self.times, 100)
+        self.check_queries(db)
+        db.close()
+        db = RexDB(time_method=self.time.gmtime, filepath="sd", new_db=False)
+        self.check_queries(db)
+
+    def test_delta_and_compression(self):
+        db = self.filled_db(delta_timestamps=True, compression="zlib")
+        db.compact(segment_bytes=2000, folder_group=2)
+        self.check_queries(db)
+
+    def test_invalid_arguments(self):
+        db = self.filled_db()
+        with self.assertRaises(ValueError):
+            db.compact(segment_bytes=0)
@@ -0,0 +1,89 @@
+from pyfakefs import fake_filesystem_unittest
+import os
+import time
+from tests.faketime import FakeTime
+
+from src.file_manager import COMPRESSED_MAGIC, FileManager
+from src.rexdb import RexDB, np
+
+
+class CompressionTest(fake_filesystem_unittest.TestCase):
+    def setUp(self):
+        self.setUpPyfakefs()
+        self.time = FakeTime()
+        os.mkdir("sd")
+
+    def make_db(self, compression, filepath="sd", **kwargs):
+        db = RexDB('if', ("integer", "float"), bytes_per_file=400, files_per_folder=3, time_method=self.time.gmtime,
+                   filepath=filepath, compression=compression, **kwargs)
+        times = []
+        for i in range(300):
+            times.append(self.time.gmtime())
+            db.log((i // 10, 20.5))
+            self.time.sleep(1)
+        return db, times
+
+    def check_queries(self, db, times):
+        expected = [(time.mktime(times[i]), i // 10, 20.5) for i in range(30, 281)]
+        self.assertEqual(db.get_data_at_range(times[30], times[280]), expected)
+        self.assertEqual(db.get_data_at_range(times[30], times[280], workers=2), expected)
+        self.assertEqual(list(db.iter_range(times[30], times[280], chunk_size=16)), expected)
+        self.assertEqual(db.query(times[0], times[-1], where=("integer", "==", 7)),
+                         [(time.mktime(times[i]), 7, 20.5) for i in range(70, 80)])
+        self.assertEqual(db.get_data_at_time(times[123]), (time.mktime(times[123]), 12, 20.5))
+        if np is not None:
+            self.assertEqual(db.get_range_array(times[30], times[280])["integer"].tolist(),
+                             [i // 10 for i in range(30, 281)])
+
+    def test_codecs(self):
+        for compression in ("zlib", "lzma"):
+            with self.subTest(compression=compression):
+                os.mkdir(f"sd/{compression}")
+                db, times = self.make_db(compression, f"sd/{compression}")
+                self.assertLess(os.path.getsize(db._file_manager.file_path(1, 2)), 200)
+                self.check_queries(db, times)
+
+    def test_reopen(self):
+        db, times = self.make_db("zlib", zone_maps=True, delta_timestamps=True)
+        db.close()
+        db = RexDB(time_method=self.time.gmtime, filepath="sd", new_db=False)
+        self.assertEqual(db._file_manager.compression, "zlib")
+        self.check_queries(db, times)
+
+    def test_uncompressed_sealed_file(self):
+        db, times = self.make_db("zlib")
+        # a file sealed by a rollover that lost power before compressing it
+        sealed = db._file_manager.file_path(1, 1)
+        with open(sealed, "rb") as fd:
+            data = FileManager.decompress(fd.read(), "zlib")
+        with open(sealed, "wb") as fd:
+            fd.write(data)
+        self.check_queries(db, times)
+
+    def test_unknown_codec(self):
+        with self.assertRaises(ValueError):
+            RexDB('i', ("integer",), filepath="sd", compression="zstd")
+
+    def test_header(self):
+        db, times = self.make_db("lzma")
+        with open(db._file_manager.file_path(1, 1), "rb") as fd:
+            self.assertEqual(fd.read(4), COMPRESSED_MAGIC + bytes([2]))
+        # compressing a file twice after a cut short rollover leaves it as it is
+        db._file_manager.compress_file(db._file_manager.file_path(1, 1))
+        self.check_queries(db, times)
+
+    def test_corrupt_file_is_reported(self):
+        db, times = self.make_db("zlib", metrics=True)
+        sealed = db._file_manager.file_path(1, 2)
+        with open(sealed, "rb+") as fd:
+            fd.truncate(fd.seek(0, os.SEEK_END) - 10)
+        # the corrupt file is not taken for raw entries
+        rows = db.get_data_at_range(times[0], times[-1])
+        self.assertLess(len(rows), 300)
+        self.assertGreaterEqual(db.stats()["counters"]["errors"], 1)
+
+        # raw files that do not hold whole entries are corrupt too
+        with open(sealed, "wb") as fd:
+            fd.write(b"\x00" * 5)
+        with self.assertRaises(ValueError):
+            db._file_manager.read_data(sealed)
@@ -0,0 +1,133 @@
+from pyfakefs import fake_filesystem_unittest
+import os
+import time
+from tests.faketime import FakeTime
+from tests.sample_db import fill, make_db
+
+from src.file_manager import HIGH_WATER_MARK, SNAPSHOT_ENTRY
+from src.rexdb import RexDB
+
+
+class ConcurrentReadersTest(fake_filesystem_unittest.TestCase):
+    def setUp(self):
+        self.setUpPyfakefs()
+        self.time = FakeTime()
+        os.mkdir("sd")
+        self.times = []
+
+    def make_reader(self, **kwargs):
+        return RexDB(time_method=self.time.gmtime, filepath="sd", new_db=False, readonly=True, **kwargs)
+
+    def expected(self, first, last):
+        return [(time.mktime(self.times[i]), i, i / 2) for i in range(first, last + 1)]
+
+    def test_refresh(self):
+        writer = make_db(self.time, publish_interval=0)
+        fill(writer, self.time, self.times, 50)
+        reader = self.make_reader()
+        self.assertEqual(reader.get_data_at_range(self.times[0], self.times[-1]), self.expected(0, 49))
+
+        # nothing new is seen until the reader refreshes, across files and folders
+        fill(writer, self.time, self.times, 100)
+        self.assertEqual(len(reader.get_data_at_range(self.times[0], self.times[-1])), 50)
+        self.assertTrue(reader.refresh())
+        self.assertFalse(reader.refresh())
+        self.assertEqual(reader.get_data_at_range(self.times[0], self.times[-1]), self.expected(0, 149))
+        self.assertEqual(reader.get_data_at_time(self.times[120]), self.expected(120, 120)[0])
+        self.assertEqual(reader.query(self.times[0], self.times[-1], where=("integer", ">=", 147),
+                                      fields=("integer",)), [(147,), (148,), (149,)])
+        self.assertEqual(reader.get_data_at_range(self.times[0], self.times[-1], workers=2),
+                         self.expected(0, 149))
+
+    def test_uncommitted_entries_are_hidden(self):
+        writer = make_db(self.time, publish_interval=3600, buffer_size=48)
+        fill(writer, self.time, self.times, 40)
+        writer.flush()
+        fill(writer, self.time, self.times, 2)
+        reader = self.make_reader()
+        with open("sd/hwm", "rb") as fd:
+            folder, file, records = HIGH_WATER_MARK.unpack(fd.read())[:3]
+        self.assertEqual(records, 40 % writer._file_manager.lines_per_file)
+        self.assertEqual(len(reader.get_data_at_range(self.times[0], self.times[-1])), 40)
+
+        # a torn entry at the end of the current file and a map entry written ahead of the mark
+        with open(f"sd/{folder}/{file:05}.db", "ab") as fd:
+            fd.write(b"\x01\x02\x03")
+        with open("sd/index.snap", "ab") as fd:
+            fd.write(SNAPSHOT_ENTRY.pack(folder, file, 0, 2 ** 40))
+        reader = self.make_reader()
+        self.assertEqual(reader.get_data_at_range(self.times[0], self.times[-1]), self.expected(0, 39))
+
+        # the writer would have finished the torn entry before publishing it
+        with open(f"sd/{folder}/{file:05}.db", "rb+") as fd:
+            fd.truncate(records * writer._packer.line_size)
+        writer.flush()
+        self.assertTrue(reader.refresh())
+        self.assertEqual(reader.get_data_at_range(self.times[0], self.times[-1])[-2:], self.expected(40, 41))
+
+    def test_current_file_sealed_under_reader(self):
+        writer = make_db(self.time, publish_interval=0, compression="zlib", zone_maps=True)
+        fill(writer, self.time, self.times, 30)
+        reader = self.make_reader()
+        # the reader's current file is compressed when the writer moves on
+        fill(writer, self.time, self.times, 30)
+        self.assertEqual(reader.get_data_at_range(self.times[0], self.times[29]), self.expected(0, 29))
+        reader.refresh()
+        self.assertEqual(reader.get_data_at_range(self.times[0], self.times[-1]), self.expected(0, 59))
+
+    def test_expired_folders(self):
+        writer = make_db(self.time, publish_interval=0, max_folders=2)
+        fill(writer, self.time, self.times, 30)
+        reader = self.make_reader()
+        fill(writer, self.time, self.times, 200)
+        reader.refresh()
+        self.assertEqual(reader._file_manager.db_index.nums.tolist(), writer._file_manager.db_index.nums.tolist())
+        self.assertEqual(reader.get_data_at_range(self.times[0], self.times[-1]),
+                         writer.get_data_at_range(self.times[0], self.times[-1]))
+
+    def test_compaction(self):
+        writer = make_db(self.time, publish_interval=0, zone_maps=True)
+        fill(writer, self.time, self.times, 200)
+        reader = self.make_reader(cache_size=1 << 16)
+        self.assertEqual(reader.get_data_at_range(self.times[0], self.times[-1]), self.expected(0, 199))
+        reader.query(self.times[0], self.times[-1], where=("integer", ">", 100))
+        generation = reader._file_manager.generation
+
+        # compaction renumbers files and empties folders the reader has loaded
+        self.assertGreater(writer.compact(segment_bytes=1000, folder_group=2), 0)
+        self.assertTrue(reader.refresh())
+        self.assertEqual(reader._file_manager.generation, generation + 1)
+        self.assertEqual(reader._file_manager.db_index.nums.tolist(), writer._file_manager.db_index.nums.tolist())
+        self.assertEqual(reader.get_data_at_range(self.times[0], self.times[-1]), self.expected(0, 199))
+        self.assertEqual(reader.query(self.times[0], self.times[-1], where=("integer", ">=", 197),
+                                      fields=("integer",)), [(197,), (198,), (199,)])
+
+        # a reopened writer carries on from the published generation
+        writer.close()
+        writer = RexDB(time_method=self.time.gmtime, filepath="sd", new_db=False, publish_interval=0)
+        self.assertEqual(writer._file_manager.generation, generation + 1)
+        fill(writer, self.time, self.times, 10)
+        self.assertTrue(reader.refresh())
+        self.assertEqual(reader.get_data_at_range(self.times[0], self.times[-1]), self.expected(0, 209))
+
+    def test_without_published_mark(self):
+        writer = make_db(self.time, )
+        fill(writer, self.time, self.times, 50)
+        writer.close()
+        self.assertFalse(os.path.exists("sd/hwm"))
+        reader = self.make_reader()
+        self.assertEqual(reader.get_data_at_range(self.times[0], self.times[-1]), self.expected(0, 49))
+
+    def test_readers_do_not_write(self):
+        writer = make_db(self.time, publish_interval=0)
+        fill(writer, self.time, self.times, 50)
+        reader = self.make_reader()
+        with self.assertRaises(RuntimeError):
+            reader.log((1, 1.0))
+        with self.assertRaises(RuntimeError):
+            reader.compact()
+        with self.assertRaises(ValueError):
+            RexDB('if', ("integer", "float"), filepath="sd", readonly=True)
+        reader.close()
+        fill(writer, self.time, self.times, 1)
+        self.assertEqual(writer.get_data_at_range(self.times[0], self.times[-1]), self.expected(0, 50))
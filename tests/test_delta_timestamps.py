@@ -0,0 +1,84 @@
+from pyfakefs import fake_filesystem_unittest
+import os
+import time
+from tests.faketime import FakeTime
+
+from src.rexdb import RexDB, np
+
+
+class DeltaTimestampsTest(fake_filesystem_unittest.TestCase):
+    def setUp(self):
+        self.setUpPyfakefs()
+        self.time = FakeTime()
+        os.mkdir("sd")
+        self.db = RexDB('i', ("integer",), bytes_per_file=60, files_per_folder=3, time_method=self.time.gmtime,
+                        filepath="sd", delta_timestamps=True)
+        self.times = []
+        for i in range(200):
+            self.times.append(self.time.gmtime())
+            self.db.log((i,))
+            self.time.sleep(1)
+
+    def test_record_size(self):
+        self.assertEqual(self.db._packer.line_size, 6)
+        self.assertEqual(self.db._file_manager.lines_per_file, 60 // 6 + 1)
+
+    def test_queries(self):
+        for i in (0, 9, 10, 123, 199):
+            self.assertEqual(self.db.get_data_at_time(self.times[i]), (time.mktime(self.times[i]), i))
+            self.assertEqual(self.db.get_data_at_time(self.times[i], fields=("integer",)), (i,))
+        expected = [(time.mktime(self.times[i]), i) for i in range(15, 171)]
+        self.assertEqual(self.db.get_data_at_range(self.times[15], self.times[170]), expected)
+        self.assertEqual(list(self.db.iter_range(self.times[15], self.times[170], chunk_size=4)), expected)
+        self.assertEqual(self.db.get_data_at_range(self.times[15], self.times[170], workers=2), expected)
+        self.assertEqual(self.db.get_data_at_range(self.times[15], self.times[170], fields=("integer", "timestamp")),
+                         [(i, t) for t, i in expected])
+        self.assertEqual(self.db.query(self.times[0], self.times[-1], where=("integer", ">=", 195)),
+                         [(time.mktime(self.times[i]), i) for i in range(195, 200)])
+
+    def test_range_array(self):
+        if np is None:
+            self.skipTest("numpy is not installed")
+        array = self.db.get_range_array(self.times[15], self.times[170])
+        self.assertEqual(array["timestamp"].tolist(), [time.mktime(self.times[i]) for i in range(15, 171)])
+        self.assertEqual(array["integer"].tolist(), list(range(15, 171)))
+
+    def test_large_gaps(self):
+        # gaps longer than a delta can hold start a new file
+        for i in range(200, 205):
+            self.time.sleep(100000)
+            self.times.append(self.time.gmtime())
+            self.db.log((i,))
+        gap = [self.time.time() + 70000 * i for i in range(1, 6)]
+        self.db.log_many([(i,) for i in range(205, 210)], [time.localtime(t) for t in gap])
+        self.times.extend(time.localtime(t) for t in gap)
+        self.assertEqual(self.db.get_data_at_range(self.times[190], self.times[-1]),
+                         [(time.mktime(self.times[i]), i) for i in range(190, 210)])
+        self.assertEqual(self.db.get_data_at_time(self.times[203]), (time.mktime(self.times[203]), 203))
+
+    def test_reopen(self):
+        self.db.close()
+        db = RexDB(time_method=self.time.gmtime, filepath="sd", new_db=False)
+        self.assertEqual(db._packer.user_fstring, "Hi")
+        self.time.sleep(1)
+        db.log((200,))
+        self.assertEqual(db.get_data_at_range(self.times[195], self.time.gmtime()),
+                         [(time.mktime(self.times[i]), i) for i in range(195, 200)] +
+                         [(time.mktime(self.time.gmtime()), 200)])
+
+    def test_bad_row_writes_nothing(self):
+        files = self.db._file_manager.files, self.db._file_manager.folders
+        cursor = self.db._cursor
+        stamps = [self.time.time() + i for i in range(30)]
+        rows = [(i,) for i in range(200, 230)]
+        rows[-1] = ("bad",)
+        with self.assertRaises(Exception):
+            self.db.log_many(rows, [time.localtime(t) for t in stamps])
+        # the rows before the bad one, in earlier files, were not written either
+        self.assertEqual((self.db._file_manager.files, self.db._file_manager.folders), files)
+        self.assertEqual(self.db._cursor, cursor)
+        self.assertEqual(len(self.db.get_data_at_range(self.times[0], time.localtime(stamps[-1]))), 200)
+        rows[-1] = (229,)
+        self.assertTrue(self.db.log_many(rows, [time.localtime(t) for t in stamps]))
+        self.assertEqual(self.db.get_data_at_range(time.localtime(stamps[0]), time.localtime(stamps[-1])),
+                         [(time.mktime(time.localtime(t)), i) for t, i in zip(stamps, range(200, 230))])
@@ -50,3 +50,30 @@ class DensePacketTest(fake_filesystem_unittest.TestCase):
                          (9.2, b'l', 1234, b'p', 1, 9.1, True, 1.1, b'm', 4321))
         self.assertEqual(packer.unpack(packer.pack((9.1, b'p', 6534, b'p', 0, 1.9, True, 4.5, b'k', 12345))),
                          (9.1, b'p', 6534, b'p', 0, 1.9, True, 4.5, b'k', 12345))
+
+    def testPackMany(self):
+        packer = DensePacker("dcichd?dci")
+        rows = [(9.2, b'l', 1234, b'p', 1, 9.1, True, 1.1, b'm', 4321),
+                (9.1, b'p', 6534, b'p', 0, 1.9, True, 4.5, b'k', 12345),
+                (0.0, b'a', -1, b'b', -2, 0.5, False, 2.5, b'c', 7)]
+        data = packer.pack_many(rows)
+        self.assertEqual(len(data), 3 * packer.line_size)
+        self.assertEqual(bytes(data), b''.join(packer.pack(row) for row in rows))
+        self.assertEqual(packer.unpack_many(data), rows)
+        # trailing partial lines are ignored
+        self.assertEqual(packer.unpack_many(data[:-1]), rows[:2])
+        self.assertEqual(packer.unpack_many(b''), [])
+
+        packer = DensePacker("i")
+        self.assertEqual(packer.unpack_many(packer.pack_many([(1,), (2,)])), [(1,), (2,)])
+
+        packer = DensePacker("ic")
+        self.assertEqual(packer.dense_user_map, [0, 1])
+        self.assertEqual(packer.unpack_many(packer.pack_many([(1, b'a')])), [(1, b'a')])
+
+    def testFieldOffsets(self):
+        packer = DensePacker("icdc")
+        self.assertEqual(packer.field_offsets, [8, 13, 0, 12])
+        line = packer.pack((32, b'f', 8.9, b'p'))
+        for i, value in enumerate((32, b'f', 8.9, b'p')):
+            self.assertEqual(packer.field_structs[i].unpack_from(line, packer.field_offsets[i])[0], value)
@@ -0,0 +1,170 @@
+from pyfakefs import fake_filesystem_unittest
+import os
+import time
+from unittest import mock
+from tests.faketime import FakeTime
+from tests.sample_db import fill, make_db
+
+from src.rexdb import RexDB
+
+
+class DurabilityTest(fake_filesystem_unittest.TestCase):
+    """
+    A crash is simulated as a power loss: every data file loses what was written to it
+    since it was last forced to disk. Metadata is only ever replaced by renames.
+    """
+
+    def setUp(self):
+        self.setUpPyfakefs()
+        self.time = FakeTime()
+        os.mkdir("sd")
+        self.times = []
+        self.synced = {}
+
+    def make_db(self, **kwargs):
+        db = make_db(self.time, **kwargs)
+        manager = db._file_manager
+        sync = manager.sync
+
+        def recording_sync():
+            success = sync()
+            self.synced[manager.current_file] = os.path.getsize(manager.current_file)
+            return success
+
+        manager.sync = recording_sync
+        return db
+
+    def crash(self):
+        for root, _, names in os.walk("sd"):
+            for name in names:
+                if name.endswith(".db"):
+                    path = f"{root}/{name}"
+                    with open(path, "rb+") as fd:
+                        fd.truncate(self.synced.get(path, 0))
+
+    def lost(self):
+        """crashes, reopens the database and returns the number of logged entries it lost"""
+        self.crash()
+        db = RexDB(time_method=self.time.gmtime, filepath="sd", new_db=False)
+        entries = db.get_data_at_range(self.times[0], self.times[-1])
+        # whatever survives is a prefix of what was logged
+        self.assertEqual(entries, [(time.mktime(self.times[i]), i, i / 2) for i in range(len(entries))])
+        return len(self.times) - len(entries)
+
+    def test_none(self):
+        db = self.make_db()
+        fill(db, self.time, self.times, 100)
+        self.assertEqual(self.synced, {})
+        self.assertEqual(self.lost(), 100)
+
+    def test_record(self):
+        db = self.make_db(durability="record")
+        fill(db, self.time, self.times, 100)
+        self.assertEqual(self.lost(), 0)
+
+    def test_batch_records(self):
+        db = self.make_db(durability="batch", sync_records=10)
+        fill(db, self.time, self.times, 95)
+        self.assertLess(self.lost(), 10)
+
+    def test_batch_interval(self):
+        db = self.make_db(durability="batch", sync_ms=60_000)
+        fill(db, self.time, self.times, 50)
+        # only rollovers sync within the interval
+        self.assertEqual(db._unsynced, db._cursor)
+        db._synced -= 60
+        fill(db, self.time, self.times, 1)
+        self.assertEqual(db._unsynced, 0)
+        self.assertEqual(self.lost(), 0)
+
+    def test_rollover(self):
+        db = self.make_db(durability="rollover")
+        fill(db, self.time, self.times, 100)
+        # only the entries of the current file are lost
+        self.assertEqual(self.lost(), db._cursor)
+        self.assertLess(db._cursor, db._file_manager.lines_per_file)
+
+    def test_log_many(self):
+        db = self.make_db(durability="record")
+        for i in range(10):
+            self.times.extend(time.localtime(time.mktime(self.time.gmtime()) + j) for j in range(10))
+            self.time.sleep(10)
+            db.log_many([(j, j / 2) for j in range(i * 10, i * 10 + 10)], self.times[-10:])
+        self.assertEqual(self.lost(), 0)
+
+    def test_interrupted_metadata_update(self):
+        db = self.make_db(durability="rollover")
+        fill(db, self.time, self.times, db._file_manager.lines_per_file)
+        with open("sd/temp", "rb") as fd:
+            temp = fd.read()
+        # a power loss during the rollover leaves the renamed files as they were
+        with mock.patch("src.file_manager.os.replace", side_effect=OSError("power loss")):
+            with self.assertRaises(OSError):
+                db.log((0, 0.0))
+        with open("sd/temp", "rb") as fd:
+            self.assertEqual(fd.read(), temp)
+        self.assertEqual(self.lost(), 0)
+
+    def test_directories_are_synced(self):
+        synced = []
+        with mock.patch("src.file_manager.FileManager.sync_directory", side_effect=synced.append):
+            os.mkdir("other")
+            fill(make_db(self.time, filepath="other"), self.time, [], 100)
+            self.assertEqual(synced, [])
+
+            db = self.make_db(durability="rollover", compression="zlib")
+            fill(db, self.time, self.times, 100)
+        manager = db._file_manager
+        # every data file, folder and renamed metadata file is linked on disk
+        for folder in range(1, manager.folders + 1):
+            self.assertIn(f"sd/{folder}", synced)
+            for file in range(1 if folder == 1 else 0, manager.files_per_folder):
+                if os.path.exists(manager.file_path(folder, file)):
+                    self.assertIn(manager.file_path(folder, file), synced)
+        for path in ("sd/temp", "sd/db_map.map", "sd/1/.map"):
+            self.assertIn(path, synced)
+
+    def test_interrupted_temp_update(self):
+        db = self.make_db(durability="record", zone_maps=True, compression="zlib")
+        manager = db._file_manager
+        replace = os.replace
+
+        def failing_replace(src, dst):
+            if dst == "sd/temp":
+                raise OSError("power loss")
+            replace(src, dst)
+
+        # the maps were updated but temp was not, in a file and then in a folder rollover
+        for rows in (manager.lines_per_file, manager.lines_per_file * (manager.files_per_folder - 1)):
+            fill(db, self.time, self.times, rows)
+            with mock.patch("src.file_manager.os.replace", side_effect=failing_replace):
+                with self.assertRaises(OSError):
+                    db.log((0, 0.0))
+            db = RexDB(time_method=self.time.gmtime, filepath="sd", new_db=False, durability="record")
+            # the sealed file is not sealed twice
+            self.assertEqual(db.get_data_at_range(self.times[0], self.times[-1]),
+                             [(time.mktime(self.times[i]), i, i / 2) for i in range(len(self.times))])
+            self.assertEqual(db.query(self.times[0], self.times[-1], where=("integer", ">=", len(self.times) - 1),
+                                      fields=("integer",)), [(len(self.times) - 1,)])
+        manager = db._file_manager
+        self.assertEqual(manager.db_index.nums.tolist(), [1])
+        self.assertEqual(manager.folder_index(1).nums.tolist(), list(range(1, manager.files_per_folder + 1)))
+
+    def test_close_batch(self):
+        db = self.make_db(durability="batch", sync_records=1000)
+        fill(db, self.time, self.times, 50)
+        self.assertTrue(db.close())
+        # nothing is lost after a clean close
+        self.assertEqual(self.lost(), 0)
+
+    def test_close_rollover(self):
+        db = self.make_db(durability="rollover")
+        fill(db, self.time, self.times, 50)
+        self.assertTrue(db.close())
+        self.assertEqual(self.lost(), 0)
+
+    def test_invalid_policy(self):
+        with self.assertRaises(ValueError):
+            self.make_db(durability="always")
+        with self.assertRaises(ValueError):
+            self.make_db(durability="batch")
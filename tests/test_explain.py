@@ -0,0 +1,57 @@
+from pyfakefs import fake_filesystem_unittest
+import os
+import time
+from tests.faketime import FakeTime
+from tests.sample_db import fill, make_db
+
+
+class ExplainTest(fake_filesystem_unittest.TestCase):
+    def setUp(self):
+        self.setUpPyfakefs()
+        self.time = FakeTime()
+        os.mkdir("sd")
+        self.times = []
+
+    def filled_db(self, **kwargs):
+        db = make_db(self.time, **kwargs)
+        fill(db, self.time, self.times, 300)
+        return db
+
+    def test_range_plan(self):
+        db = self.filled_db()
+        lines = db._file_manager.lines_per_file
+        entries, plan = db.get_data_at_range(self.times[20], self.times[40], explain=True)
+        self.assertEqual(entries, db.get_data_at_range(self.times[20], self.times[40]))
+        self.assertEqual(plan["records_returned"], 21)
+        self.assertEqual(plan["records_decoded"], 21)
+        self.assertEqual(plan["bytes_read"], 21 * db._packer.line_size)
+
+        # the range spans the files holding lines 20 to 40, in the folders holding those files
+        files = [(stats["folder"], stats["file"]) for stats in plan["files_scanned"]]
+        self.assertEqual(files, db._file_manager.files_from_range(time.mktime(self.times[20]),
+                                                                  time.mktime(self.times[40])))
+        self.assertEqual(len(files), 40 // lines - 20 // lines + 1)
+        self.assertEqual(plan["folders_scanned"], sorted({folder for folder, _ in files}))
+        self.assertEqual(plan["folders"], db._file_manager.folders)
+        self.assertEqual(plan["folders_pruned"], plan["folders"] - len(plan["folders_scanned"]))
+        self.assertEqual(plan["files"], 3 * len(plan["folders_scanned"]))
+        self.assertEqual(plan["files_pruned"], plan["files"] - len(files))
+        self.assertEqual(sum(stats["returned"] for stats in plan["files_scanned"]), 21)
+        for phase in ("plan_us", "scan_us", "total_us"):
+            self.assertGreaterEqual(plan[phase], 0)
+
+    def test_filtered_plan(self):
+        db = self.filled_db(zone_maps=True)
+        entries, plan = db.query(self.times[0], self.times[-1], where=("integer", ">=", 290), fields=("integer",),
+                                 explain=True)
+        self.assertEqual(entries, [(i,) for i in range(290, 300)])
+        self.assertEqual(plan["records_returned"], 10)
+        self.assertEqual(plan["folders_pruned"], 0)
+        skipped = [stats for stats in plan["files_scanned"] if stats["skipped"]]
+        self.assertEqual(plan["files_skipped"], len(skipped))
+        self.assertGreater(len(skipped), 0)
+        self.assertTrue(all(stats["decoded"] == 0 for stats in skipped))
+        # only the last sealed file and the current file can hold matches
+        lines = db._file_manager.lines_per_file
+        self.assertEqual(plan["records_decoded"], lines + 300 % lines)
+        self.assertEqual(plan["files_skipped"], len(plan["files_scanned"]) - 2)
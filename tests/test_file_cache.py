@@ -0,0 +1,72 @@
+from pyfakefs import fake_filesystem_unittest
+import os
+import time
+import unittest
+from tests.faketime import FakeTime
+
+from src.file_cache import FileCache
+from src.rexdb import RexDB
+
+
+class FileCacheTest(unittest.TestCase):
+    def test_lru_eviction(self):
+        cache = FileCache(10)
+        cache.put("a", b"1234")
+        cache.put("b", b"1234")
+        self.assertEqual(cache.get("a"), b"1234")
+        cache.put("c", b"1234")
+        # b was the least recently used
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), b"1234")
+        cache.put("d", b"12345678901")
+        self.assertIsNone(cache.get("d"))
+        self.assertEqual(cache.stats(), {"hits": 2, "misses": 2, "evictions": 1, "files": 2, "bytes": 8})
+
+    def test_invalidate(self):
+        cache = FileCache(10)
+        cache.put("a", b"1234")
+        cache.put("a", b"123")
+        self.assertEqual(cache.used, 3)
+        cache.invalidate("a")
+        self.assertEqual((len(cache), cache.used), (0, 0))
+
+
+class QueryCacheTest(fake_filesystem_unittest.TestCase):
+    def setUp(self):
+        self.setUpPyfakefs()
+        self.time = FakeTime()
+        os.mkdir("sd")
+        self.db = RexDB('if', ("integer", "float"), bytes_per_file=100, files_per_folder=3,
+                        time_method=self.time.gmtime, filepath="sd", cache_size=4096)
+        self.times = []
+        for i in range(100):
+            self.times.append(self.time.gmtime())
+            self.db.log((i, i / 2))
+            self.time.sleep(1)
+
+    def test_repeated_queries(self):
+        expected = self.db.get_data_at_range(self.times[40], self.times[99])
+        misses = self.db.cache_stats()["misses"]
+        self.assertEqual(self.db.get_data_at_range(self.times[40], self.times[99]), expected)
+        self.assertEqual(self.db.get_data_at_time(self.times[50]), (time.mktime(self.times[50]), 50, 25.0))
+        stats = self.db.cache_stats()
+        self.assertEqual(stats["misses"], misses)
+        self.assertGreater(stats["hits"], 0)
+
+    def test_current_file_invalidated(self):
+        self.assertEqual(len(self.db.get_data_at_range(self.times[95], self.times[99])), 5)
+        self.db.log((100, 50.0))
+        self.assertEqual(self.db.get_data_at_range(self.times[95], self.time.gmtime())[-1],
+                         (time.mktime(self.time.gmtime()), 100, 50.0))
+
+    def test_evictions(self):
+        db = RexDB('if', ("integer", "float"), bytes_per_file=100, files_per_folder=3,
+                   time_method=self.time.gmtime, filepath="sd", new_db=False, cache_size=300)
+        self.assertEqual(len(db.get_data_at_range(self.times[0], self.times[99])), 100)
+        stats = db.cache_stats()
+        self.assertGreater(stats["evictions"], 0)
+        self.assertLessEqual(stats["bytes"], 300)
+
+    def test_no_cache(self):
+        db = RexDB('i', ("integer",), time_method=self.time.gmtime, filepath="sd", new_db=False)
+        self.assertIsNone(db.cache_stats())
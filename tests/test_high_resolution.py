@@ -0,0 +1,64 @@
+from pyfakefs import fake_filesystem_unittest
+import os
+
+from src.rexdb import RexDB
+
+START = 1_600_000_000_000_000_000
+PERIOD = 1_000_000  # 1 kHz
+
+
+class FakeNanoseconds:
+    def __init__(self):
+        self.now = START
+
+    def time_ns(self):
+        return self.now
+
+
+class HighResolutionTest(fake_filesystem_unittest.TestCase):
+    def setUp(self):
+        self.setUpPyfakefs()
+        self.clock = FakeNanoseconds()
+        os.mkdir("sd")
+        self.db = RexDB('if', ("integer", "float"), bytes_per_file=160, files_per_folder=4,
+                        time_method=self.clock.time_ns, filepath="sd", high_resolution=True)
+        self.times = []
+        for i in range(2000):
+            self.clock.now += PERIOD
+            self.times.append(self.clock.now)
+            self.db.log((i, i / 2))
+
+    def test_point_lookups(self):
+        for i in (0, 1, 17, 999, 1000, 1999):
+            self.assertEqual(self.db.get_data_at_time(self.times[i]), (self.times[i], i, i / 2))
+        self.assertIsNone(self.db.get_data_at_time(self.times[10] + 1))
+
+    def test_tight_ranges(self):
+        self.assertEqual(self.db.get_data_at_range(self.times[500], self.times[502]),
+                         [(self.times[i], i, i / 2) for i in range(500, 503)])
+        self.assertEqual(self.db.get_data_at_range(self.times[500] + 1, self.times[501] - 1), [])
+        self.assertEqual(len(self.db.get_data_at_range(self.times[0], self.times[-1])), 2000)
+        # floats are seconds
+        self.assertEqual(self.db.get_data_at_range(self.times[3] / 1e9, self.times[3] / 1e9, fields=("integer",)),
+                         [(3,)])
+
+    def test_reopen(self):
+        self.db.close()
+        db = RexDB('if', ("integer", "float"), time_method=self.clock.time_ns, filepath="sd", new_db=False)
+        self.assertEqual(db.get_data_at_time(self.times[1234]), (self.times[1234], 1234, 617.0))
+        self.clock.now += PERIOD
+        db.log((2000, 1000.0))
+        self.assertEqual(db.get_data_at_time(self.clock.now), (self.clock.now, 2000, 1000.0))
+        self.assertEqual(len(db.get_data_at_range(self.times[0], self.clock.now)), 2001)
+
+    def test_rollups(self):
+        os.mkdir("sd/rollups_db")
+        db = RexDB('i', ("integer",), time_method=self.clock.time_ns, filepath="sd/rollups_db", new_db=True,
+                   rollup_buckets=(1,), high_resolution=True)
+        first = self.clock.now
+        for i in range(3000):
+            self.clock.now += PERIOD
+            db.log((i,))
+        buckets = db.get_rollup(first, self.clock.now, 1, "integer")
+        self.assertEqual(sum(bucket[1] for bucket in buckets), 3000)
+        self.assertTrue(all(bucket[0] % 1_000_000_000 == 0 for bucket in buckets))
@@ -0,0 +1,65 @@
+from pyfakefs import fake_filesystem_unittest
+import os
+import time
+from tests.faketime import FakeTime
+
+from src.file_manager import SNAPSHOT_ENTRY
+from src.rexdb import RexDB
+
+
+class IndexSnapshotTest(fake_filesystem_unittest.TestCase):
+    def setUp(self):
+        self.setUpPyfakefs()
+        self.time = FakeTime()
+        os.mkdir("sd")
+        self.db = RexDB('if', ("integer", "float"), bytes_per_file=100, files_per_folder=3,
+                        time_method=self.time.gmtime, filepath="sd")
+        self.times = []
+        for i in range(300):
+            self.times.append(self.time.gmtime())
+            self.db.log((i, i / 2))
+            self.time.sleep(1)
+        self.db.close()
+
+    def read_snapshot(self):
+        with open("sd/index.snap", "rb") as fd:
+            return list(SNAPSHOT_ENTRY.iter_unpack(fd.read()))
+
+    def reopen(self):
+        return RexDB(time_method=self.time.gmtime, filepath="sd", new_db=False)
+
+    def check_queries(self, db):
+        self.assertEqual(db.get_data_at_range(self.times[20], self.times[250]),
+                         [(time.mktime(self.times[i]), i, i / 2) for i in range(20, 251)])
+        self.assertEqual(db.get_data_at_time(self.times[77]), (time.mktime(self.times[77]), 77, 38.5))
+
+    def test_one_entry_per_sealed_file(self):
+        manager = self.db._file_manager
+        expected = []
+        for folder in range(1, manager.folders + 1):
+            index = manager.folder_index(folder)
+            expected.extend(zip([folder] * len(index), index.nums, index.starts, index.ends))
+        self.assertEqual(self.read_snapshot(), expected)
+        self.assertEqual(len(expected), 300 // manager.lines_per_file)
+
+    def test_reopen_without_folder_maps(self):
+        db = self.reopen()
+        for folder in db._file_manager.db_index.nums:
+            os.remove(f"sd/{folder}/.map")
+        self.check_queries(db)
+
+    def test_missing_snapshot_is_rebuilt(self):
+        snapshot = self.read_snapshot()
+        os.remove("sd/index.snap")
+        db = self.reopen()
+        # reopening seals the current file
+        self.assertEqual(self.read_snapshot()[:len(snapshot)], snapshot)
+        self.check_queries(db)
+
+    def test_lost_snapshot_entry(self):
+        snapshot = self.read_snapshot()
+        with open("sd/index.snap", "rb+") as fd:
+            fd.truncate((len(snapshot) - 1) * SNAPSHOT_ENTRY.size)
+        db = self.reopen()
+        self.assertEqual(self.read_snapshot()[:len(snapshot)], snapshot)
+        self.check_queries(db)
@@ -0,0 +1,54 @@
+from pyfakefs import fake_filesystem_unittest
+import os
+import types
+from tests.faketime import FakeTime
+
+from src.rexdb import RexDB
+
+
+class IterRangeTest(fake_filesystem_unittest.TestCase):
+    def setUp(self):
+        self.setUpPyfakefs()
+        self.time = FakeTime()
+        os.mkdir("sd")
+        self.db = RexDB('if', ("integer", "float"), bytes_per_file=200, files_per_folder=4,
+                        time_method=self.time.gmtime, filepath="sd")
+        self.times = []
+        for i in range(500):
+            self.times.append(self.time.gmtime())
+            self.db.log((i, i / 2))
+            self.time.sleep(1)
+
+    def test_matches_range(self):
+        iterator = self.db.iter_range(self.times[17], self.times[433])
+        self.assertIsInstance(iterator, types.GeneratorType)
+        data = list(iterator)
+        self.assertEqual([entry[1] for entry in data], list(range(17, 434)))
+        self.assertEqual(data, self.db.get_data_at_range(self.times[17], self.times[433]))
+
+    def test_chunks_are_bounded(self):
+        chunks = list(self.db.iter_chunks(self.times[0], self.times[-1], chunk_size=7))
+        self.assertTrue(all(0 < len(chunk) <= 7 for chunk in chunks))
+        self.assertEqual([entry[1] for chunk in chunks for entry in chunk], list(range(500)))
+
+    def test_stops_after_end(self):
+        # chunks never span files, the range crosses one file boundary
+        chunks = list(self.db.iter_chunks(self.times[100], self.times[102], chunk_size=1000))
+        self.assertEqual([[entry[1] for entry in chunk] for chunk in chunks], [[100, 101], [102]])
+
+    def test_lazy(self):
+        iterator = self.db.iter_range(self.times[0], self.times[-1], chunk_size=1)
+        self.assertEqual(next(iterator)[1], 0)
+        self.assertEqual(next(iterator)[1], 1)
+        iterator.close()
+
+    def test_empty(self):
+        self.time.sleep(100)
+        self.assertEqual(list(self.db.iter_range(self.time.gmtime(), self.time.gmtime())), [])
+
+    def test_invalid_chunk_size(self):
+        for chunk_size in (0, -1):
+            with self.assertRaises(ValueError):
+                next(self.db.iter_range(self.times[0], self.times[-1], chunk_size=chunk_size))
+            with self.assertRaises(ValueError):
+                list(self.db.iter_chunks(self.times[0], self.times[-1], chunk_size=chunk_size))
@@ -0,0 +1,85 @@
+from pyfakefs import fake_filesystem_unittest
+import os
+import time
+from tests.faketime import FakeTime
+
+from src.rexdb import RexDB
+
+
+class LogManyTest(fake_filesystem_unittest.TestCase):
+    def setUp(self):
+        self.setUpPyfakefs()
+        self.time = FakeTime()
+
+    def test_matches_log(self):
+        """log_many writes the same files and maps as a loop of log calls"""
+        os.mkdir("a")
+        os.mkdir("b")
+        base = int(self.time.time())
+        now = [base]
+
+        def clock():
+            return time.localtime(now[0])
+
+        db_a = RexDB('if', ("integer", "float"), 20, 2, time_method=clock, filepath="a")
+        times = []
+        for i in range(25):
+            now[0] = base + i
+            times.append(clock())
+            db_a.log((i, 0.25))
+
+        now[0] = base
+        db_b = RexDB('if', ("integer", "float"), 20, 2, time_method=clock, filepath="b")
+        db_b.log_many([(i, 0.25) for i in range(25)], times)
+
+        self.assertEqual(db_a._file_manager.folders, db_b._file_manager.folders)
+        self.assertEqual(db_a._file_manager.files, db_b._file_manager.files)
+        for folder in range(1, db_a._file_manager.folders + 1):
+            for name in os.listdir(f"a/{folder}"):
+                with open(f"a/{folder}/{name}", "rb") as fd_a, open(f"b/{folder}/{name}", "rb") as fd_b:
+                    self.assertEqual(fd_a.read(), fd_b.read())
+        with open("a/db_map.map", "rb") as fd_a, open("b/db_map.map", "rb") as fd_b:
+            self.assertEqual(fd_a.read(), fd_b.read())
+
+        data = db_b.get_data_at_range(times[3], times[21])
+        self.assertEqual([entry[1] for entry in data], list(range(3, 22)))
+
+    def test_batches_continue_log(self):
+        os.mkdir("sd")
+        db = RexDB('i', ("int",), bytes_per_file=40, files_per_folder=3,
+                   time_method=self.time.gmtime, filepath="sd")
+        db.log((0,))
+        times = []
+        for i in range(4):
+            self.time.sleep(1)
+            times.append(self.time.gmtime())
+            db.log_many([(i * 10 + j,) for j in range(10)])
+        self.time.sleep(1)
+        db.log((99,))
+
+        data = db.get_data_at_range(times[0], times[3])
+        self.assertEqual([entry[1] for entry in data], list(range(40)))
+        self.assertEqual([entry[0] for entry in data], [time.mktime(t) for t in times for _ in range(10)])
+
+    def test_buffered(self):
+        os.mkdir("sd")
+        with RexDB('i', ("int",), bytes_per_file=40, time_method=self.time.gmtime,
+                   filepath="sd", buffer_size=32) as db:
+            times = [self.time.gmtime()]
+            for i in range(1, 30):
+                self.time.sleep(1)
+                times.append(self.time.gmtime())
+            db.log_many([(i,) for i in range(30)], times)
+            data = db.get_data_at_range(times[0], times[-1])
+            self.assertEqual([entry[1] for entry in data], list(range(30)))
+
+    def test_backwards(self):
+        db = RexDB('i', ("int",), time_method=self.time.gmtime)
+        now = self.time.time()
+        with self.assertRaises(ValueError):
+            db.log_many([(1,), (2,)], [time.localtime(now + 2), time.localtime(now + 1)])
+        with self.assertRaises(ValueError):
+            db.log_many([(1,)], [time.localtime(now - 100)])
+        with self.assertRaises(ValueError):
+            db.log_many([(1,), (2,)], [time.localtime(now)])
+        self.assertTrue(db.log_many([]))
@@ -0,0 +1,100 @@
+from pyfakefs import fake_filesystem_unittest
+import os
+import unittest
+from tests.faketime import FakeTime
+from tests.sample_db import fill, make_db
+
+from src.metrics import Histogram, Metrics
+
+
+class HistogramTest(unittest.TestCase):
+    def test_percentiles(self):
+        histogram = Histogram()
+        for value in range(1, 101):
+            histogram.add(value)
+        snapshot = histogram.snapshot()
+        self.assertEqual(snapshot["count"], 100)
+        self.assertEqual(snapshot["mean"], 50.5)
+        self.assertEqual((snapshot["min"], snapshot["max"]), (1, 100))
+        # percentiles are bucket upper bounds, within a factor of two of the exact value
+        self.assertEqual(snapshot["p50"], 64)
+        self.assertEqual(snapshot["p99"], 100)
+        self.assertEqual(Histogram().snapshot(), {"count": 0})
+
+
+class MetricsTest(fake_filesystem_unittest.TestCase):
+    def setUp(self):
+        self.setUpPyfakefs()
+        self.time = FakeTime()
+        os.mkdir("sd")
+        self.times = []
+
+    def filled_db(self, **kwargs):
+        db = make_db(self.time, **kwargs)
+        fill(db, self.time, self.times, 100)
+        return db
+
+    def test_counters(self):
+        db = self.filled_db(metrics=True)
+        stats = db.stats()
+        counters, histograms = stats["counters"], stats["histograms"]
+        lines = db._file_manager.lines_per_file
+        self.assertEqual(counters["rows_logged"], 100)
+        self.assertEqual(counters["rollovers"], 99 // lines)
+        self.assertEqual(histograms["log_us"]["count"], 100)
+        self.assertEqual(histograms["folder_map_write_us"]["count"], 99 // lines)
+        self.assertIn("db_map_write_us", histograms)
+        self.assertNotIn("queries", counters)
+
+        db.get_data_at_time(self.times[5])
+        db.get_data_at_range(self.times[0], self.times[-1])
+        stats = db.stats()
+        self.assertEqual(stats["counters"]["queries"], 2)
+        self.assertEqual(stats["histograms"]["point_query_us"]["count"], 1)
+        self.assertEqual(stats["histograms"]["range_query_us"]["count"], 1)
+        files = stats["histograms"]["files_per_query"]
+        self.assertEqual((files["min"], files["max"]), (1, 99 // lines + 1))
+        self.assertEqual(stats["histograms"]["bytes_per_query"]["max"], 100 * db._packer.line_size)
+
+    def test_hooks(self):
+        metrics = Metrics()
+        events = []
+        metrics.add_hook(lambda name, value: events.append((name, value)))
+        db = self.filled_db(metrics=metrics)
+        self.assertIn(("rows_logged", 1), events)
+        self.assertEqual(db.stats()["counters"], metrics.stats()["counters"])
+
+        db._file_manager.report("could not write to folder map", OSError("disk full"))
+        self.assertEqual(events[-1], ("error", "could not write to folder map: disk full"))
+        self.assertEqual(metrics.counters["errors"], 1)
+
+    def test_read_errors(self):
+        metrics = Metrics()
+        errors = []
+        metrics.add_hook(lambda name, value: errors.append(value) if name == "error" else None)
+        db = self.filled_db(metrics=metrics, zone_maps=True, rollup_buckets=(60,))
+        os.remove(db._file_manager.file_path(1, 1))
+        os.remove("sd/1/.zone")
+        os.remove("sd/rollups/60.rlp")
+        db._zone_map.folders.clear()
+
+        # files that are missing are left out of every kind of query, and reported
+        db.get_data_at_time(self.times[0])
+        db.get_data_at_range(self.times[0], self.times[-1])
+        db.get_data_at_range(self.times[0], self.times[-1], workers=2)
+        db.query(self.times[0], self.times[-1], where=("integer", ">", 10))
+        db.get_rollup(self.times[0], self.times[-1], 60, "integer")
+        for message in ("could not find data", "could not search file", "couldn't access zone map",
+                        "could not read rollup"):
+            self.assertTrue(any(error.startswith(message) for error in errors), message)
+        self.assertEqual(metrics.counters["errors"], len(errors))
+
+    def test_cache_stats(self):
+        db = self.filled_db(metrics=True, cache_size=1 << 16)
+        self.assertIn("cache", db.stats())
+
+    def test_disabled(self):
+        db = self.filled_db()
+        self.assertIsNone(db.stats())
+        self.assertIsNone(db._file_manager.metrics)
+        self.assertEqual(len(db.get_data_at_range(self.times[0], self.times[-1])), 100)
@@ -0,0 +1,57 @@
+from pyfakefs import fake_filesystem_unittest
+from concurrent.futures import ThreadPoolExecutor
+import os
+import tempfile
+import unittest
+from tests.faketime import FakeTime
+
+from src.rexdb import RexDB
+
+
+def log_rows(db, clock, rows):
+    times = []
+    for i in range(rows):
+        times.append(clock.gmtime())
+        db.log((i, i / 4))
+        clock.sleep(1)
+    return times
+
+
+class ParallelScanTest(fake_filesystem_unittest.TestCase):
+    def setUp(self):
+        self.setUpPyfakefs()
+        self.time = FakeTime()
+        os.mkdir("sd")
+        self.db = RexDB('if', ("integer", "float"), bytes_per_file=100, files_per_folder=3,
+                        time_method=self.time.gmtime, filepath="sd")
+        self.times = log_rows(self.db, self.time, 400)
+
+    def test_threads(self):
+        expected = self.db.get_data_at_range(self.times[13], self.times[377])
+        self.assertEqual(len(expected), 365)
+        for workers in (1, 2, 4):
+            self.assertEqual(self.db.get_data_at_range(self.times[13], self.times[377], workers=workers), expected)
+        self.assertEqual(self.db.get_data_at_range(self.times[13], self.times[377], executor="thread"), expected)
+
+    def test_existing_executor(self):
+        expected = self.db.get_data_at_range(self.times[0], self.times[-1], fields=("float",))
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            result = self.db.get_data_at_range(self.times[0], self.times[-1], fields=("float",), executor=executor)
+        self.assertEqual(result, expected)
+
+    def test_unknown_executor(self):
+        with self.assertRaises(ValueError):
+            self.db.get_data_at_range(self.times[0], self.times[-1], executor="fiber")
+
+
+class ProcessScanTest(unittest.TestCase):
+    def test_processes(self):
+        """process workers read from the real file system, so this test does not use pyfakefs"""
+        clock = FakeTime()
+        with tempfile.TemporaryDirectory() as filepath:
+            db = RexDB('if', ("integer", "float"), bytes_per_file=100, files_per_folder=3,
+                       time_method=clock.gmtime, filepath=filepath)
+            times = log_rows(db, clock, 200)
+            expected = db.get_data_at_range(times[5], times[190])
+            result = db.get_data_at_range(times[5], times[190], workers=2, executor="process")
+            self.assertEqual(result, expected)
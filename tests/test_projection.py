@@ -0,0 +1,49 @@
+from pyfakefs import fake_filesystem_unittest
+import os
+from tests.faketime import FakeTime
+
+from src.rexdb import RexDB
+from src.dense_packer import DensePacker
+
+
+class ProjectionTest(fake_filesystem_unittest.TestCase):
+    def setUp(self):
+        self.setUpPyfakefs()
+        self.time = FakeTime()
+
+    def test_packer_projection(self):
+        packer = DensePacker("dcichd?dci")
+        row = (9.2, b'l', 1234, b'p', 1, 9.1, True, 1.1, b'm', 4321)
+        line = packer.pack(row)
+        codec, _ = packer.projection((2, 0))
+        self.assertEqual(codec.size, packer.line_size)
+        self.assertEqual(packer.unpack(line, (2, 0)), (1234, 9.2))
+        self.assertEqual(packer.unpack(line, (9,)), (4321,))
+        self.assertEqual(packer.unpack(line, tuple(range(10))), row)
+        self.assertEqual(packer.unpack_many(line * 3, (6, 1)), [(True, b'l')] * 3)
+
+    def test_queries(self):
+        os.mkdir("sd")
+        db = RexDB('ci?f', ("char", "voltage", "bool", "float"), bytes_per_file=100,
+                   files_per_folder=3, time_method=self.time.gmtime, filepath="sd")
+        times = []
+        for i in range(100):
+            times.append(self.time.gmtime())
+            db.log((b'a', i, i % 2 == 0, 0.5))
+            self.time.sleep(1)
+
+        rows = db.get_data_at_range(times[10], times[90])
+        projected = db.get_data_at_range(times[10], times[90], fields=("voltage", "timestamp"))
+        self.assertEqual(projected, [(row[2], row[0]) for row in rows])
+        self.assertEqual(list(db.iter_range(times[10], times[90], fields=("bool",))),
+                         [(row[3],) for row in rows])
+
+        self.assertEqual(db.get_data_at_time(times[42], fields=("voltage",)), (42,))
+        self.assertEqual(db.get_data_at_time(times[42], fields="voltage"), (42,))
+
+    def test_unknown_field(self):
+        db = RexDB('i', ("int",), time_method=self.time.gmtime)
+        with self.assertRaises(ValueError):
+            db.get_data_at_range(self.time.gmtime(), self.time.gmtime(), fields=("voltage",))
+        with self.assertRaises(ValueError):
+            db.get_data_at_time(self.time.gmtime(), fields=())
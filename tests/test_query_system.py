@@ -114,3 +114,20 @@ class QueryTests(fake_filesystem_unittest.TestCase):
         self.assertEqual(data[2][1], 17)
         self.assertEqual(data[3][1], 18)
         self.assertEqual(data[4][1], 19)
+
+    def test_data_large_file(self):
+        """point queries find the first entry logged at a time within large files"""
+        db = RexDB('ic', ("integer", "char"), bytes_per_file=100000, time_method=self.time.gmtime)
+        times = []
+        for i in range(2000):
+            if i % 4 == 0:
+                times.append(self.time.gmtime())
+            db.log((i, b'a'))
+            if i % 4 == 3:
+                self.time.sleep(1)
+
+        for i in range(len(times)):
+            data = db.get_data_at_time(times[i])
+            self.assertEqual(data[1], i * 4)
+        self.time.sleep(10)
+        self.assertEqual(db.get_data_at_time(self.time.gmtime()), None)
@@ -0,0 +1,48 @@
+from pyfakefs import fake_filesystem_unittest
+import os
+import time
+import unittest
+from tests.faketime import FakeTime
+
+from src.rexdb import RexDB, np
+
+
+@unittest.skipIf(np is None, "numpy is not installed")
+class RangeArrayTest(fake_filesystem_unittest.TestCase):
+    def setUp(self):
+        self.setUpPyfakefs()
+        self.time = FakeTime()
+
+    def test_matches_range(self):
+        os.mkdir("sd")
+        db = RexDB('ci?fd', ("char", "int", "bool", "float", "double"), bytes_per_file=100,
+                   files_per_folder=3, time_method=self.time.gmtime, filepath="sd")
+        times = []
+        for i in range(300):
+            times.append(self.time.gmtime())
+            db.log((b'a', i, i % 2 == 0, i / 4, i * 1.5))
+            self.time.sleep(1)
+
+        array = db.get_range_array(times[25], times[260])
+        self.assertEqual(array.dtype.names, ("timestamp", "char", "int", "bool", "float", "double"))
+        self.assertEqual(array["int"].tolist(), list(range(25, 261)))
+        self.assertEqual(array["timestamp"].tolist(), [time.mktime(t) for t in times[25:261]])
+
+        rows = db.get_data_at_range(times[25], times[260])
+        self.assertEqual([tuple(entry) for entry in array.tolist()], rows)
+
+    def test_unnamed_fields(self):
+        os.mkdir("sd")
+        db = RexDB('ii', ("a", "a"), time_method=self.time.gmtime, filepath="sd")
+        start = self.time.gmtime()
+        db.log((1, 2))
+        array = db.get_range_array(start, self.time.gmtime())
+        self.assertEqual(array.dtype.names, ("timestamp", "a", "f2"))
+        self.assertEqual(array[0]["f2"], 2)
+
+    def test_empty(self):
+        db = RexDB('i', ("int",), time_method=self.time.gmtime)
+        self.time.sleep(10)
+        array = db.get_range_array(self.time.gmtime(), self.time.gmtime())
+        self.assertEqual(len(array), 0)
+        self.assertEqual(array.dtype.names, ("timestamp", "int"))
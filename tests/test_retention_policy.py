@@ -0,0 +1,75 @@
+from pyfakefs import fake_filesystem_unittest
+import os
+import time
+from tests.faketime import FakeTime
+from tests.sample_db import fill, make_db
+
+from src.file_manager import SNAPSHOT_ENTRY
+from src.rexdb import RexDB
+
+
+def folder_dirs(filepath):
+    return sorted(int(entry) for entry in os.listdir(filepath) if entry.isdigit())
+
+
+class RetentionPolicyTest(fake_filesystem_unittest.TestCase):
+    def setUp(self):
+        self.setUpPyfakefs()
+        self.time = FakeTime()
+        os.mkdir("sd")
+
+    def test_max_folders(self):
+        db = make_db(self.time, max_folders=3)
+        times = fill(db, self.time, [], 500)
+        folders = folder_dirs("sd")
+        self.assertEqual(len(folders), 3)
+        self.assertEqual(folders[-1], db._file_manager.folders)
+        self.assertEqual(db._file_manager.db_index.nums.tolist(), folders[:-1])
+        with open("sd/index.snap", "rb") as fd:
+            self.assertEqual({entry[0] for entry in SNAPSHOT_ENTRY.iter_unpack(fd.read())}, set(folders))
+
+        # expired times return nothing, the rest of the range is intact
+        self.assertEqual(db.get_data_at_range(times[0], times[100]), [])
+        self.assertIsNone(db.get_data_at_time(times[50]))
+        entries = db.get_data_at_range(times[0], times[-1])
+        self.assertEqual(entries[-1], (time.mktime(times[-1]), 499, 249.5))
+        self.assertEqual([entry[1] for entry in entries], list(range(entries[0][1], 500)))
+
+    def test_max_age(self):
+        db = make_db(self.time, max_age=200)
+        times = fill(db, self.time, [], 500)
+        entries = db.get_data_at_range(times[0], times[-1])
+        # only whole folders that ended before the cutoff are deleted
+        self.assertLessEqual(entries[0][1], 300)
+        self.assertGreater(entries[0][1], 200)
+        self.assertEqual(len(entries), 500 - entries[0][1])
+
+    def test_max_bytes(self):
+        db = make_db(self.time, max_bytes=1000)
+        times = []
+        for rows in (300, 300, 300):
+            fill(db, self.time, times, rows)
+            used = sum(db._file_manager.folder_size(folder) for folder in folder_dirs("sd"))
+            # at most one folder over the limit, which is about 300 bytes
+            self.assertLess(used, 1000 + 400)
+
+    def test_reopen(self):
+        db = make_db(self.time, max_folders=2)
+        times = fill(db, self.time, [], 300)
+        db.close()
+        db = RexDB(time_method=self.time.gmtime, filepath="sd", new_db=False, max_folders=2)
+        fill(db, self.time, times, 200)
+        self.assertEqual(len(folder_dirs("sd")), 2)
+        self.assertEqual(db.get_data_at_range(times[-5], times[-1])[-1][1], 499)
+
+    def test_zone_maps(self):
+        db = make_db(self.time, max_folders=2, zone_maps=True)
+        times = fill(db, self.time, [], 300)
+        db.query(times[0], times[-1], where=("integer", ">", 100))
+        # the zones of expired folders are not kept in memory
+        self.assertLessEqual(set(db._zone_map.folders), set(folder_dirs("sd")))
+        self.assertEqual(len(db.query(times[-5], times[-1], where=("integer", ">", 100))), 5)
+
+    def test_invalid_limit(self):
+        with self.assertRaises(ValueError):
+            make_db(self.time, max_folders=0)
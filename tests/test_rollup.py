@@ -0,0 +1,69 @@
+from pyfakefs import fake_filesystem_unittest
+import os
+import time
+from tests.faketime import FakeTime
+
+from src.rexdb import RexDB
+
+
+class RollupTest(fake_filesystem_unittest.TestCase):
+    def setUp(self):
+        self.setUpPyfakefs()
+        self.time = FakeTime()
+        os.mkdir("sd")
+
+    def expected(self, rows, bucket, index):
+        buckets = {}
+        for row in rows:
+            start = row[0] - row[0] % bucket
+            buckets.setdefault(start, []).append(row[index])
+        return [(start, len(values), sum(values), min(values), max(values))
+                for start, values in sorted(buckets.items())]
+
+    def test_matches_raw_data(self):
+        db = RexDB('if?c', ("int", "float", "bool", "char"), bytes_per_file=100, files_per_folder=3,
+                   time_method=self.time.gmtime, filepath="sd", rollup_buckets=(10, 60))
+        start = self.time.gmtime()
+        for i in range(500):
+            db.log((i % 37, i / 8, True, b'a'))
+            self.time.sleep(0.7)
+        db.log_many([(i, 0.5, False, b'b') for i in range(50)])
+        end = self.time.gmtime()
+
+        rows = db.get_data_at_range(start, end)
+        for bucket in (10, 60):
+            self.assertEqual(db.get_rollup(start, end, bucket, "int"), self.expected(rows, bucket, 1))
+            self.assertEqual(db.get_rollup(start, end, bucket, "float"), self.expected(rows, bucket, 2))
+
+        # only buckets starting in the range are returned
+        middle = time.mktime(start) + 120
+        rollup = db.get_rollup(time.localtime(middle), time.localtime(middle + 60), 10, "int")
+        self.assertEqual([entry[0] for entry in rollup],
+                         [middle - middle % 10 + 10 * i for i in range(7)])
+
+    def test_reopen(self):
+        db = RexDB('i', ("int",), time_method=self.time.gmtime, filepath="sd", rollup_buckets=(60,))
+        start = self.time.gmtime()
+        for i in range(100):
+            db.log((i,))
+            self.time.sleep(1)
+        db.close()
+
+        db = RexDB(filepath="sd", time_method=self.time.gmtime, new_db=False)
+        for i in range(100, 200):
+            db.log((i,))
+            self.time.sleep(1)
+        end = self.time.gmtime()
+
+        rows = db.get_data_at_range(start, end)
+        self.assertEqual(len(rows), 200)
+        self.assertEqual(db.get_rollup(start, end, 60, "int"), self.expected(rows, 60, 1))
+
+    def test_invalid(self):
+        db = RexDB('ic', ("int", "char"), time_method=self.time.gmtime, filepath="sd", rollup_buckets=(60,))
+        now = self.time.gmtime()
+        with self.assertRaises(ValueError):
+            db.get_rollup(now, now, 10, "int")
+        with self.assertRaises(ValueError):
+            db.get_rollup(now, now, 60, "char")
+        self.assertEqual(db.get_rollup(now, now, 60, "int"), [])
@@ -0,0 +1,127 @@
+from pyfakefs import fake_filesystem_unittest
+import os
+import queue
+import threading
+from tests.faketime import FakeTime
+
+from src.rexdb import RexDB
+from src.threaded_rexdb import ThreadedRexDB
+
+
+class ThreadedRexDBTest(fake_filesystem_unittest.TestCase):
+    def setUp(self):
+        self.setUpPyfakefs()
+        self.time = FakeTime()
+        os.mkdir("sd")
+
+    def make_db(self, **kwargs):
+        return ThreadedRexDB.open('ii', ("sensor", "index"), bytes_per_file=100, files_per_folder=3,
+                                  time_method=self.time.gmtime, filepath="sd", **kwargs)
+
+    def test_concurrent_producers(self):
+        start = self.time.gmtime()
+        db = self.make_db(max_queued=16, batch_size=64)
+
+        def produce(sensor):
+            for i in range(200):
+                self.assertTrue(db.log((sensor, i)))
+
+        threads = [threading.Thread(target=produce, args=(sensor,)) for sensor in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertTrue(db.log_many([(99, i) for i in range(20)]))
+        db.flush()
+
+        rows = db.get_data_at_range(start, self.time.gmtime())
+        self.assertEqual(len(rows), 1620)
+        for sensor in range(8):
+            self.assertEqual([row[2] for row in rows if row[1] == sensor], list(range(200)))
+        self.assertEqual((db.written, db.dropped, db.failed), (1620, 0, 0))
+        self.assertLessEqual(db.batches, 1620)
+        self.assertTrue(db.close())
+
+    def test_full_queue(self):
+        db = self.make_db(max_queued=2, full="drop")
+        # hold the database so the writer thread cannot drain the queue
+        with db._db_lock:
+            results = [db.log((0, i)) for i in range(10)]
+            self.assertTrue(all(results[:2]))
+            self.assertFalse(results[-1])
+            self.assertGreater(db.dropped, 0)
+            self.assertFalse(db.wait(0.01))
+        self.assertTrue(db.wait())
+        self.assertEqual(db.written + db.dropped, 10)
+
+        db.full = "error"
+        with db._db_lock:
+            with self.assertRaises(queue.Full):
+                for i in range(10):
+                    db.log((1, i))
+
+        db.full, db.timeout = "block", 0.01
+        with db._db_lock:
+            results = [db.log((2, i)) for i in range(10)]
+            self.assertFalse(results[-1])
+        db.close()
+
+    def test_sync_every_batch(self):
+        db = self.make_db(sync=True)
+        syncs = []
+        sync = db.db.sync
+
+        def counting_sync():
+            syncs.append(db.written)
+            return sync()
+
+        db.db.sync = counting_sync
+        for i in range(50):
+            db.log((0, i))
+        db.flush()
+        self.assertEqual(len(syncs), db.batches)
+        db.close()
+
+    def test_bad_row(self):
+        start = self.time.gmtime()
+        db = self.make_db()
+        # the bad row is refused by its producer, the batch it would have joined is written
+        with db._db_lock:
+            for i in range(50):
+                db.log((0, i))
+            with self.assertRaises(ValueError):
+                db.log(("bad",))
+            with self.assertRaises(ValueError):
+                db.log_many([(1, 0), (1, "bad")])
+        db.flush()
+        self.assertEqual((db.written, db.failed), (50, 0))
+
+        # rows that only fail once written are retried alone, failing nothing else
+        with db._db_lock:
+            db.log((2, 0))
+            with db._order:
+                db.put([("bad",)], [db._last])
+            db.log((2, 1))
+        db.flush()
+        self.assertEqual((db.written, db.failed), (52, 1))
+        self.assertEqual([row[1:] for row in db.get_data_at_range(start, self.time.gmtime())],
+                         [(0, i) for i in range(50)] + [(2, 0), (2, 1)])
+        db.close()
+
+    def test_invalid_use(self):
+        rexdb = RexDB('ii', ("sensor", "index"), time_method=self.time.gmtime, filepath="sd")
+        with self.assertRaises(ValueError):
+            ThreadedRexDB(rexdb, full="wait")
+        with self.assertRaises(ValueError):
+            rexdb.check_row(("bad",))
+        rexdb.check_row((0, 0))
+        self.assertEqual(rexdb.last_timestamp(), rexdb.now())
+        db = ThreadedRexDB(rexdb)
+        now = self.time.gmtime()
+        self.time.sleep(5)
+        db.log((0, 0))
+        with self.assertRaises(ValueError):
+            db.log_many([(0, 1)], [now])
+        db.close()
+        with self.assertRaises(RuntimeError):
+            db.log((0, 2))
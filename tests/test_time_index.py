@@ -0,0 +1,71 @@
+from pyfakefs import fake_filesystem_unittest
+import os
+import struct
+import time
+from tests.faketime import FakeTime
+
+from src.rexdb import RexDB
+from src.time_index import TimeIndex
+
+
+class TimeIndexTest(fake_filesystem_unittest.TestCase):
+    def setUp(self):
+        self.setUpPyfakefs()
+        self.time = FakeTime()
+
+    def test_lookup(self):
+        data = struct.pack("iiiiiiiii", 10, 20, 1, 20, 30, 2, 30, 40, 3) + b'\x00'
+        index = TimeIndex.from_bytes(data)
+        self.assertEqual(len(index), 3)
+        self.assertEqual(index.find(9), None)
+        self.assertEqual(index.find(10), 1)
+        self.assertEqual(index.find(19.5), 1)
+        self.assertEqual(index.find(20), 2)
+        self.assertEqual(index.find(39), 3)
+        self.assertEqual(index.find(40), None)
+
+        self.assertEqual(index.overlapping(0, 5), [])
+        self.assertEqual(index.overlapping(12, 14), [1])
+        self.assertEqual(index.overlapping(20, 20), [1, 2])
+        self.assertEqual(index.overlapping(25, 100), [2, 3])
+        self.assertEqual(index.overlapping(41, 100), [])
+
+        index.append(40, 50, 4)
+        self.assertEqual(index.find(45), 4)
+
+    def test_range_inside_one_file(self):
+        """ranges that fall inside a single file or folder still find it"""
+        os.mkdir("sd")
+        db = RexDB('i', ("int",), bytes_per_file=40, files_per_folder=3,
+                   time_method=self.time.gmtime, filepath="sd")
+        times = []
+        for i in range(100):
+            times.append(self.time.gmtime())
+            db.log((i,))
+            self.time.sleep(1)
+
+        for i in range(100):
+            data = db.get_data_at_range(times[i], times[i])
+            self.assertEqual([entry[1] for entry in data], [i])
+
+    def test_no_map_reads_after_load(self):
+        os.mkdir("sd")
+        db = RexDB('i', ("int",), bytes_per_file=40, files_per_folder=3,
+                   time_method=self.time.gmtime, filepath="sd")
+        times = []
+        for i in range(100):
+            times.append(self.time.gmtime())
+            db.log((i,))
+            self.time.sleep(1)
+
+        db = RexDB(filepath="sd", time_method=self.time.gmtime, new_db=False)
+        locations = [db._file_manager.location_from_time(time.mktime(t)) for t in times]
+
+        os.remove("sd/db_map.map")
+        for folder in range(1, db._file_manager.folders + 1):
+            os.remove(f"sd/{folder}/.map")
+
+        for t, location in zip(times, locations):
+            self.assertEqual(db._file_manager.location_from_time(time.mktime(t)), location)
+        data = db.get_data_at_range(times[0], times[-1])
+        self.assertEqual([entry[1] for entry in data], list(range(100)))
@@ -0,0 +1,68 @@
+from pyfakefs import fake_filesystem_unittest
+import os
+from tests.faketime import FakeTime
+
+from src.rexdb import RexDB
+
+
+class ZoneMapTest(fake_filesystem_unittest.TestCase):
+    def setUp(self):
+        self.setUpPyfakefs()
+        self.time = FakeTime()
+        os.mkdir("sd")
+
+    def make_db(self, zone_maps=True):
+        db = RexDB('ifc', ("temperature", "voltage", "char"), bytes_per_file=100, files_per_folder=3,
+                   time_method=self.time.gmtime, filepath="sd", zone_maps=zone_maps)
+        self.start = self.time.gmtime()
+        for i in range(300):
+            # a single spike in an otherwise flat temperature series
+            db.log((100 if i == 150 else 20 + i % 5, i / 2, b'a'))
+            self.time.sleep(1)
+        self.end = self.time.gmtime()
+        return db
+
+    def test_matches_filter(self):
+        db = self.make_db()
+        rows = db.get_data_at_range(self.start, self.end)
+        self.assertEqual(db.query(self.start, self.end, where=("temperature", ">", 80)),
+                         [row for row in rows if row[1] > 80])
+        self.assertEqual(db.query(self.start, self.end, where=[("temperature", "==", 22), ("voltage", "<", 20)]),
+                         [row for row in rows if row[1] == 22 and row[2] < 20])
+        self.assertEqual(db.query(self.start, self.end, where=[("char", "==", b'a'), ("voltage", ">=", 149.5)],
+                                  fields=("voltage",)),
+                         [(row[2],) for row in rows if row[2] >= 149.5])
+        self.assertEqual(db.query(self.start, self.end), rows)
+
+    def test_skips_files(self):
+        db = self.make_db()
+        opened = []
+        scan_file = db.scan_file
+
+        def counting_scan_file(filepath, *args, **kwargs):
+            opened.append(filepath)
+            return (yield from scan_file(filepath, *args, **kwargs))
+
+        db.scan_file = counting_scan_file
+        self.assertEqual(len(db.query(self.start, self.end, where=("temperature", ">", 80))), 1)
+        # the file holding the spike and the unsealed current file
+        self.assertEqual(len(opened), 2)
+
+    def test_reopen(self):
+        self.make_db()
+        db = RexDB(filepath="sd", time_method=self.time.gmtime, new_db=False)
+        self.assertIsNotNone(db._zone_map)
+        result = db.query(self.start, self.end, where=("temperature", ">", 80))
+        self.assertEqual([row[1] for row in result], [100])
+
+    def test_disabled(self):
+        db = self.make_db(zone_maps=False)
+        self.assertFalse(os.path.exists("sd/1/.zone"))
+        self.assertEqual(len(db.query(self.start, self.end, where=("temperature", ">", 80))), 1)
+
+    def test_invalid(self):
+        db = RexDB('i', ("int",), time_method=self.time.gmtime)
+        with self.assertRaises(ValueError):
+            db.query(self.time.gmtime(), self.time.gmtime(), where=("int", "~", 1))
+        with self.assertRaises(ValueError):
+            db.query(self.time.gmtime(), self.time.gmtime(), where=("float", "<", 1))